@@ -144,3 +144,95 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Background image analysis (python manage.py run_analysis_workers)
+ANALYSIS_WORKERS = 2
+ANALYSIS_POLL_INTERVAL = 1.0
+ANALYSIS_JOB_TIMEOUT = 600
+ANALYSIS_MAX_ATTEMPTS = 3
+ANALYSIS_WORKER_THREADS = 4
+
+# YOLO requests arriving within the wait window are run as one predict() call
+YOLO_BATCH_MAX_SIZE = 8
+YOLO_BATCH_MAX_WAIT_MS = 20
+
+# AI models are loaded lazily on first use (see imageapp/ml.py)
+YOLO_WEIGHTS = 'yolov8n.pt'
+REMBG_MODEL = 'u2net'
+# Preload every model when the WSGI/ASGI server starts
+WARM_MODELS_ON_STARTUP = False
+
+# Face detection runs on a copy downscaled to this long edge; encodings
+# are still computed on the full-resolution image
+FACE_DETECTION_MAX_SIDE = 1024
+FACE_DETECTION_UPSAMPLE = 1
+FACE_DETECTION_MODEL = 'hog'
+# Skip face detection when YOLO found no person in the image
+FACE_REQUIRE_PERSON = True
+
+# Identifies the models/settings behind stored labels and face embeddings.
+# Uploads whose SHA-256 matches an image analysed with the same version
+# reuse its results instead of running YOLO and face_recognition again.
+ANALYSIS_VERSION = (
+    f'{YOLO_WEIGHTS}|face:{FACE_DETECTION_MODEL}:{FACE_DETECTION_MAX_SIDE}'
+    f':{FACE_DETECTION_UPSAMPLE}:{int(FACE_REQUIRE_PERSON)}'
+)
+
+# POST /api/upload/bulk/
+BULK_UPLOAD_MAX_FILES = 500
+DATA_UPLOAD_MAX_NUMBER_FILES = BULK_UPLOAD_MAX_FILES
+
+# Image lists (?page_size= / ?cursor=)
+IMAGE_PAGE_SIZE = 60
+IMAGE_MAX_PAGE_SIZE = 500
+
+# Per-user face similarity index (imageapp/face_index.py). Indexes with at
+# least FACE_INDEX_IVF_MIN_SIZE faces only scan the nprobe closest lists.
+FACE_INDEX_IVF_MIN_SIZE = 50000
+FACE_INDEX_IVF_NPROBE = 8
+
+# Per-user memory-mapped face embedding files (imageapp/embeddings.py).
+# Kept outside MEDIA_ROOT, which is served without authentication; the
+# files are rebuilt from the database on first use.
+FACE_EMBEDDINGS_DIR = os.path.join(BASE_DIR, 'var', 'embeddings')
+
+# Per-face thumbnails cut from stored boxes (imageapp/face_thumbnails.py)
+FACE_THUMBNAIL_SIZE = 80
+FACE_THUMBNAIL_PADDING = 0.5  # extra margin on each side, relative to the face box
+FACE_THUMBNAIL_WORKERS = 4
+
+# People tab (imageapp/face_groups.py); entries are also invalidated by version
+FACE_GROUPS_CACHE_TIMEOUT = 60 * 60
+FACE_SPRITE_COLUMNS = 16  # cells per row of the People sprite sheet
+
+# Decoded images shared by the edit endpoints, per process (imageapp/image_cache.py)
+DECODED_IMAGE_CACHE_BYTES = 512 * 1024 * 1024
+EDIT_PREFIX_CACHE_BYTES = 256 * 1024 * 1024  # intermediate preview renders, keyed by chain prefix
+PREVIEW_MAX_SIZE = 4096  # largest preview_size accepted by the edit preview endpoint
+
+# Downscaled copies served to the app's grids (imageapp/renditions.py)
+RENDITION_SIZES = (256, 1024, 2048)  # long edge in pixels
+RENDITION_WORKERS = 2
+RENDITION_URL_MAX_AGE = 24 * 60 * 60  # signed on-demand rendition links, seconds
+
+# Encoder settings per kind of output (imageapp/encoding.py); the first
+# format of each entry is the default. `manage.py benchmark encoders`
+# reports size and encode time for every entry.
+ENCODER_POLICIES = {
+    # Saved edits become the source of later edits: near-lossless, full chroma
+    'edit': {'JPEG': {'quality': 95, 'subsampling': 0}},
+    # Proxy previews are re-rendered from the original on save
+    'preview': {
+        'JPEG': {'quality': 80, 'subsampling': 2},
+        'WEBP': {'quality': 80, 'method': 1},
+    },
+    'rendition': {
+        'JPEG': {'quality': 80, 'subsampling': 2, 'progressive': True, 'optimize': True},
+        'WEBP': {'quality': 80, 'method': 4},
+    },
+    'face_thumbnail': {'JPEG': {'quality': 85, 'optimize': True}},
+    'sprite': {'JPEG': {'quality': 90, 'optimize': True}},
+    # Stored once, so worth the slow optimizer; previews favour speed
+    'sticker': {'PNG': {'compress_level': 9, 'optimize': True}},
+    'sticker_preview': {'PNG': {'compress_level': 1}},
+}
@@ -1,8 +1,9 @@
 import { useEffect, useState } from 'react';
 import { View, Text, FlatList, Image, StyleSheet, TouchableOpacity, ActivityIndicator } from 'react-native';
 import { Ionicons } from '@expo/vector-icons';
+import AsyncStorage from '@react-native-async-storage/async-storage';
 
-import { IP } from './config';
+import { IP, tileUri } from './config';
 
 export default function FaceGroupView({ route, navigation }) {
   const ids = Array.isArray(route.params?.ids) ? route.params.ids : [];
@@ -22,9 +23,12 @@ export default function FaceGroupView({ route, navigation }) {
           return;
         }
 
+        const token = await AsyncStorage.getItem('access');
         const results = await Promise.all(
           ids.map(id =>
-            fetch(`http://${IP}:8000/api/images/${id}/`).then(res => res.json())
+            fetch(`http://${IP}:8000/api/images/${id}/`, {
+              headers: { Authorization: `Bearer ${token}` },
+            }).then(res => res.json())
           )
         );
 
@@ -44,7 +48,7 @@ export default function FaceGroupView({ route, navigation }) {
     onPress={() => navigation.navigate('ImageDetail', { id: item.id })}
     style={styles.imageWrapper}
   >
-    <Image source={{ uri: item.image }} style={styles.image} />
+    <Image source={{ uri: tileUri(item) }} style={styles.image} />
   </TouchableOpacity>
 );
 
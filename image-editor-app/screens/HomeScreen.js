@@ -6,7 +6,7 @@ import { SafeAreaView } from 'react-native-safe-area-context';
 import AsyncStorage from '@react-native-async-storage/async-storage';
 import moment from 'moment';
 
-import { IP } from './config';
+import { IP, tileUri } from './config';
 
 export default function HomeScreen() {
   const [images, setImages] = useState([]);
@@ -65,7 +65,7 @@ useFocusEffect(
       style={styles.imageWrapper}
       onPress={() => navigation.navigate('ImageDetail', { id: item.id })}
     >
-      <Image source={{ uri: item.image }} style={styles.image} />
+      <Image source={{ uri: tileUri(item) }} style={styles.image} />
     </TouchableOpacity>
   );
 
@@ -108,7 +108,7 @@ useFocusEffect(
                     style={styles.imageWrapper}
                     onPress={() => navigation.navigate('ImageDetail', { id: img.id })}
                   >
-                    <Image source={{ uri: img.image }} style={styles.image} />
+                    <Image source={{ uri: tileUri(img) }} style={styles.image} />
                   </TouchableOpacity>
                 ))}
               </View>
@@ -1,5 +1,5 @@
 import React, { useEffect, useState, useCallback } from 'react';
-import { View, Text, Image, StyleSheet, ActivityIndicator, Alert, ScrollView, TouchableOpacity, Dimensions, StatusBar, TouchableWithoutFeedback, Modal, Animated, Easing } from 'react-native';
+import { View, Text, Image, StyleSheet, ActivityIndicator, Alert, ScrollView, TouchableOpacity, Dimensions, PixelRatio, StatusBar, TouchableWithoutFeedback, Modal, Animated, Easing } from 'react-native';
 import { Ionicons } from '@expo/vector-icons';
 import { SafeAreaView } from 'react-native-safe-area-context';
 import { useFocusEffect } from '@react-navigation/native';
@@ -23,6 +23,11 @@ export default function ImageDetailScreen({ route, navigation }) {
   const [stickerPreview, setStickerPreview] = useState(null);
   const [stickerScale] = useState(new Animated.Value(0.5));
   const screenWidth = Dimensions.get('window').width;
+  // Previews are rendered at screen resolution; saving renders full size.
+  // The server rejects previews above 4096 px (PREVIEW_MAX_SIZE).
+  const previewSize = Math.min(4096, Math.round(
+    Math.max(screenWidth, Dimensions.get('window').height) * PixelRatio.get()
+  ));
   const [mainAspectRatio, setMainAspectRatio] = useState(1);
   const [stickerAspectRatio, setStickerAspectRatio] = useState(1);
   const [editChain, setEditChain] = useState([]);
@@ -32,7 +37,10 @@ export default function ImageDetailScreen({ route, navigation }) {
   const [showDeleteModal, setShowDeleteModal] = useState(false);
 
   useEffect(() => {
-    fetch(`http://${IP}:8000/api/images/${id}/`)
+    AsyncStorage.getItem('access')
+      .then(token => fetch(`http://${IP}:8000/api/images/${id}/`, {
+        headers: { Authorization: `Bearer ${token}` },
+      }))
       .then(res => res.json())
       .then(data => {
         setImageData(data);
@@ -81,7 +89,10 @@ useEffect(() => {
 }, [showCustomModal]);
 
    const refreshImage = () => {
-  fetch(`http://${IP}:8000/api/images/${id}/`)
+  AsyncStorage.getItem('access')
+    .then(token => fetch(`http://${IP}:8000/api/images/${id}/`, {
+      headers: { Authorization: `Bearer ${token}` },
+    }))
     .then(res => res.json())
     .then(data => {
       setImageData(data);
@@ -127,36 +138,30 @@ const closeModal = () => {
 
 const displayedImage = React.useMemo(() => {
   if (!imageData) return null;
+  // Inline chain previews are addressed by their chain; the server's ETag does the caching.
+  if (editedImage?.chain) return editedImage;
   const base = editedImage || imageData.image;
-  return `${base}?t=${timestamp}`;
+  return { uri: `${base}?t=${timestamp}` };
 }, [editedImage, imageData, timestamp]);
 
 const sendEditChain = async (newChain) => {
   const token = await AsyncStorage.getItem('access');
-  try {
-    const response = await fetch(`http://${IP}:8000/api/edit/preview_chain/`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        Authorization: `Bearer ${token}`,
-      },
-      body: JSON.stringify({ image_id: id, edits: newChain }),
-    });
-
-    if (!response.ok) {
-      const errorText = await response.text();
-      console.error('Preview error:', errorText);
-      triggerModal('Failed to preview edit.');
-      return;
-    }
-
-    const { edited } = await response.json();
-    setEditedImage(edited);
-    setTimestamp(Date.now());
-  } catch (err) {
-    console.error(err);
-    triggerModal('Something went wrong.');
-  }
+  const query = [
+    `image_id=${id}`,
+    `preview_size=${previewSize}`,
+    ...newChain.map(edit => `edits=${encodeURIComponent(edit)}`),
+  ].join('&');
+
+  // The preview image is streamed straight from the server; nothing is
+  // stored until Save / Save as copy sends the chain.
+  setEditedImage({
+    uri: `http://${IP}:8000/api/edit/preview_chain/?${query}`,
+    headers: {
+      Authorization: `Bearer ${token}`,
+      Accept: 'image/webp,image/jpeg;q=0.9',
+    },
+    chain: newChain,
+  });
 };
 
  const debouncedSendChain = debounce(sendEditChain, 300);
@@ -185,7 +190,7 @@ const handleSave = async () => {
           'Content-Type': 'application/json',
           Authorization: `Bearer ${token}`,
         },
-        body: JSON.stringify({}),
+        body: JSON.stringify(editedImage.chain ? { edits: editedImage.chain } : {}),
       }
     );
 
@@ -231,7 +236,10 @@ const handleSaveAsCopy = async () => {
           'Content-Type': 'application/json',
           Authorization: `Bearer ${token}`,
         },
-        body: JSON.stringify({ original_id: id }),
+        body: JSON.stringify({
+          original_id: id,
+          ...(editedImage.chain ? { edits: editedImage.chain } : {}),
+        }),
       }
     );
 
@@ -276,8 +284,10 @@ const handleRevert = () => {
 
 const confirmDelete = async () => {
   try {
+    const token = await AsyncStorage.getItem('access');
     await fetch(`http://${IP}:8000/api/images/${id}/`, {
       method: 'DELETE',
+      headers: { Authorization: `Bearer ${token}` },
     });
     setShowDeleteModal(false);
     triggerModal('Image has been deleted.');
@@ -451,7 +461,7 @@ const confirmDelete = async () => {
     }}
   >
     <Animated.Image
-  source={{ uri: displayedImage }}
+  source={displayedImage}
   style={[
     styles.detailImage,
     {
@@ -13,7 +13,7 @@ import AsyncStorage from '@react-native-async-storage/async-storage';
 import { Ionicons } from '@expo/vector-icons';
 import { SafeAreaView, useSafeAreaInsets } from 'react-native-safe-area-context';
 
-import { IP } from './config';
+import { IP, tileUri } from './config';
 
 export default function RecycleBinScreen() {
   const [deletedImages, setDeletedImages] = useState([]);
@@ -108,7 +108,7 @@ export default function RecycleBinScreen() {
 
   const renderItem = ({ item }) => (
     <View style={styles.imageContainer}>
-      <Image source={{ uri: item.image }} style={styles.image} />
+      <Image source={{ uri: tileUri(item) }} style={styles.image} />
       <View style={styles.buttonsRow}>
         <TouchableOpacity onPress={() => restoreImage(item.id)} style={styles.restoreBtn}>
           <Ionicons name="refresh" size={20} color="#A0F6CF" />
@@ -4,26 +4,31 @@ import { Ionicons } from '@expo/vector-icons';
 import { SafeAreaView } from 'react-native-safe-area-context';
 import AsyncStorage from '@react-native-async-storage/async-storage';
 
-import { IP } from './config';
+import { IP, tileUri } from './config';
+
+// Sprite cells are 80px; avatars are 70px including a 2px border.
+const SPRITE_SCALE = (70 - 2 * 2) / 80;
 
 export default function SearchScreen({ navigation }) {
   const [query, setQuery] = useState('');
   const [results, setResults] = useState([]);
   const [searching, setSearching] = useState(false);
   const [faceGroups, setFaceGroups] = useState([]);
+  const [faceSprite, setFaceSprite] = useState(null);
   const [editingIndex, setEditingIndex] = useState(null);
   const [newName, setNewName] = useState('');
 
 const fetchFaceGroups = async () => {
   try {
     const token = await AsyncStorage.getItem('access');
-    const res = await fetch(`http://${IP}:8000/api/faces/group/`, {
-      headers: {
-        Authorization: `Bearer ${token}`,
-      },
-    });
+    const headers = { Authorization: `Bearer ${token}` };
+    const [res, spriteRes] = await Promise.all([
+      fetch(`http://${IP}:8000/api/faces/group/`, { headers }),
+      fetch(`http://${IP}:8000/api/faces/sprite/`, { headers }),
+    ]);
     const data = await res.json();
     setFaceGroups(data.groups || []);
+    setFaceSprite(spriteRes.ok ? await spriteRes.json() : null);
   } catch (err) {
     console.error('Face group fetch failed', err);
   }
@@ -55,7 +60,7 @@ useEffect(() => {
 
   const renderItem = ({ item }) => (
     <TouchableOpacity onPress={() => navigation.navigate('ImageDetail', { id: item.id })} style={styles.imageWrapper}>
-      <Image source={{ uri: item.image }} style={styles.image} />
+      <Image source={{ uri: tileUri(item) }} style={styles.image} />
     </TouchableOpacity>
   );
 
@@ -93,7 +98,7 @@ useEffect(() => {
               const clusterId = group.id;
               const label = group.name || 'Unknown';
 
-              const imageUrl = `http://${IP}:8000/media/uploads/face_${firstId}.jpg`;
+              const imageUrl = group.thumbnail || `http://${IP}:8000/media/uploads/face_${firstId}.jpg`;
 
               return (
                 <TouchableOpacity
@@ -106,7 +111,22 @@ useEffect(() => {
 
                   style={styles.faceGroupCard}
                 >
-                  <Image source={{ uri: imageUrl }} style={styles.faceImage} />
+                  {faceSprite && faceSprite.offsets[clusterId] ? (
+                    <View style={[styles.faceImage, { overflow: 'hidden' }]}>
+                      <Image
+                        source={{ uri: faceSprite.sprite }}
+                        style={{
+                          position: 'absolute',
+                          width: faceSprite.width * SPRITE_SCALE,
+                          height: faceSprite.height * SPRITE_SCALE,
+                          left: -faceSprite.offsets[clusterId][0] * SPRITE_SCALE,
+                          top: -faceSprite.offsets[clusterId][1] * SPRITE_SCALE,
+                        }}
+                      />
+                    </View>
+                  ) : (
+                    <Image source={{ uri: imageUrl }} style={styles.faceImage} />
+                  )}
                   {editingIndex === index ? (
                     <TextInput
                       value={newName}
@@ -1 +1,3 @@
-export const IP = '192.168.100.129';
\ No newline at end of file
+export const IP = '192.168.100.129';
+// Smallest server-side rendition for grid tiles; falls back to the original.
+export const tileUri = (item, size = '256') => item.renditions?.[size]?.webp || item.image;
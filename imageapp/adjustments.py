@@ -0,0 +1,58 @@
+# imageapp/adjustments.py
+import numpy as np
+from PIL import Image
+
+# Rows sharpened at a time; keeps each strip's temporaries in cache.
+STRIP_ROWS = 16
+
+# Image.convert('L') weights
+LUMA_WEIGHTS = (0.299, 0.587, 0.114)
+
+def saturation_matrix(factor):
+    """
+    Image.convert('RGB', matrix) coefficients for ImageEnhance.Color:
+    each channel becomes luma + factor * (channel - luma). Pillow rounds
+    where the enhancer truncates, so results differ by at most one level.
+    """
+    matrix = []
+    for channel in range(3):
+        matrix += [(1 - factor) * weight + (factor if band == channel else 0) for band, weight in enumerate(LUMA_WEIGHTS)]
+        matrix.append(0)
+    return tuple(matrix)
+
+def sharpen(img, factor):
+    """
+    ImageEnhance.Sharpness as one pass: a blend with the 3x3 SMOOTH
+    filter ([1 1 1; 1 5 1; 1 1 1] / 13, border pixels unfiltered). Rows
+    are read from `img` and written into a copy a strip at a time, so the
+    only full-size allocation is the result.
+    """
+    width, height = img.size
+    out = img.copy()
+    if width < 3 or height < 3:
+        return out
+
+    for start in range(1, height - 1, STRIP_ROWS):
+        end = min(start + STRIP_ROWS, height - 1)
+        window = np.asarray(img.crop((0, start - 1, width, end + 1)), dtype=np.float32)
+
+        # Sums of small integers are exact in float32; +6.5 then floor is
+        # the filter's rounding, (s + 6) // 13, kept clear of ties.
+        rows = window[:-2] + window[1:-1]
+        rows += window[2:]
+        smooth = rows[:, :-2] + rows[:, 1:-1]
+        smooth += rows[:, 2:]
+        smooth += 4 * window[1:-1, 1:-1]
+        smooth += 6.5
+        smooth *= np.float32(1 / 13)
+        np.floor(smooth, out=smooth)
+
+        # Image.blend(smooth, img, factor), clipped and truncated
+        pixels = window[1:-1, 1:-1]
+        pixels -= smooth
+        pixels *= np.float32(factor)
+        pixels += smooth
+        np.clip(pixels, 0, 255, out=pixels)
+        out.paste(Image.fromarray(pixels.astype(np.uint8)), (1, start))
+
+    return out
@@ -0,0 +1,164 @@
+# imageapp/analysis.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image, ImageOps
+from django.conf import settings
+from .batching import InferenceBatcher
+from .embeddings import pack_encoding, unpack_encoding
+from .faces import find_faces, prepare_detection_image
+from .labels import replace_image_labels
+from .ml import get_model
+from .models import FaceEmbedding, ImageUpload
+
+def _labels_from_result(result):
+    labels = set()
+    for box in result.boxes:
+        class_id = int(box.cls[0])
+        labels.add(result.names[class_id])
+    return list(labels)
+
+def predict_labels_batch(sources):
+    results = get_model('yolo').predict(source=list(sources), save=False, conf=0.5, batch=len(sources), verbose=False)
+    return [_labels_from_result(result) for result in results]
+
+yolo_batcher = InferenceBatcher(
+    predict_labels_batch,
+    max_batch_size=settings.YOLO_BATCH_MAX_SIZE,
+    max_wait_ms=settings.YOLO_BATCH_MAX_WAIT_MS,
+)
+
+def load_rgb(path):
+    """
+    Decode `path` once into an EXIF-oriented RGB uint8 array that
+    every analyzer can share.
+    """
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        return np.asarray(img.convert('RGB'))
+
+def detect_objects(rgb):
+    # ultralytics treats NumPy input as BGR
+    return yolo_batcher(np.ascontiguousarray(rgb[:, :, ::-1]))
+
+def detect_faces(rgb, labels_future):
+    # Downscaling overlaps with YOLO; detection waits for its labels so
+    # photos without a person skip the face pipeline.
+    prepared = prepare_detection_image(rgb)
+    labels = labels_future.result()
+    return find_faces(rgb, labels, prepared=prepared)
+
+def _timed(timings, stage, func, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+def analyze_image(image):
+    """
+    Decode `image` once and run object detection and face encoding on
+    it concurrently. Per-stage timings in ms are returned under
+    `timings`. Nothing is written to the database; see `save_analysis`.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    rgb = _timed(timings, 'decode_ms', load_rgb, image.image.path)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        labels = pool.submit(_timed, timings, 'yolo_ms', detect_objects, rgb)
+        faces = pool.submit(_timed, timings, 'faces_ms', detect_faces, rgb, labels)
+        locations, encodings = faces.result()
+        result = {
+            'labels': labels.result(),
+            'locations': locations,
+            'encodings': encodings,
+        }
+
+    timings['analysis_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    result['timings'] = timings
+    return result
+
+def _analyze_or_error(image):
+    try:
+        return analyze_image(image)
+    except Exception as e:
+        return e
+
+def analyze_batch(images):
+    """
+    Analyse several images concurrently so their YOLO calls are merged
+    into shared predict() batches. Failed images yield the exception
+    instead of a result.
+    """
+    with ThreadPoolExecutor(max_workers=settings.YOLO_BATCH_MAX_SIZE) as pool:
+        return list(pool.map(_analyze_or_error, images))
+
+def find_analysis_donor(image):
+    """
+    Return another image with the same content hash that was already
+    analysed by the current model version, if there is one.
+    """
+    if not image.content_hash:
+        return None
+    return (
+        ImageUpload.objects
+        .filter(content_hash=image.content_hash, analysis_version=settings.ANALYSIS_VERSION)
+        .exclude(pk=image.pk)
+        .first()
+    )
+
+def find_analysis_donors(images):
+    """
+    Like `find_analysis_donor` for many images at once; returns a dict
+    mapping content hash to donor image, with embeddings prefetched.
+    """
+    hashes = {image.content_hash for image in images if image.content_hash}
+    if not hashes:
+        return {}
+
+    donors = (
+        ImageUpload.objects
+        .filter(content_hash__in=hashes, analysis_version=settings.ANALYSIS_VERSION)
+        .exclude(pk__in=[image.pk for image in images])
+        .prefetch_related('face_embeddings')
+    )
+    return {donor.content_hash: donor for donor in donors}
+
+def reuse_analysis(donor):
+    embeddings = list(donor.face_embeddings.all())
+    return {
+        'labels': list(donor.labels),
+        'locations': [embedding.location for embedding in embeddings],
+        'encodings': [unpack_encoding(embedding.encoding) for embedding in embeddings],
+        'timings': {'reused_from': donor.id},
+    }
+
+def save_analysis_batch(pairs):
+    """
+    Store (image, result) pairs with one bulk update for the images and
+    one bulk insert for all their face embeddings.
+    """
+    images = []
+    embeddings = []
+
+    for image, result in pairs:
+        image.labels = result['labels']
+        image.analysis_version = settings.ANALYSIS_VERSION
+        images.append(image)
+
+        for location, encoding in zip(result['locations'], result['encodings']):
+            embeddings.append(FaceEmbedding(
+                image=image,
+                encoding=pack_encoding(encoding),
+                location=list(location) if location is not None else None,
+                clustered=False
+            ))
+
+    ImageUpload.objects.bulk_update(images, ['labels', 'analysis_version'])
+    replace_image_labels(images)
+    FaceEmbedding.objects.bulk_create(embeddings)
+
+def save_analysis(image, result):
+    save_analysis_batch([(image, result)])
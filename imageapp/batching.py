@@ -0,0 +1,67 @@
+# imageapp/batching.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class InferenceBatcher:
+    """
+    Collect items submitted from many threads and hand them to
+    `predict_batch` as one list. A batch is flushed when it reaches
+    `max_batch_size` or when the oldest item has waited `max_wait_ms`.
+    `predict_batch` must return one result per item, in order.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=8, max_wait_ms=20):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.predict_batch(items))
+                # zip() would leave the callers of missing results waiting forever.
+                if len(results) != len(batch):
+                    raise RuntimeError(f'predict_batch returned {len(results)} results for {len(batch)} items')
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
@@ -0,0 +1,317 @@
+# imageapp/clustering.py
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import transaction
+from .embeddings import load_user_embeddings, unpack_encoding, unpack_encodings
+from .face_groups import bump_face_groups
+from .face_thumbnails import generate_face_thumbnails
+from .models import FaceEmbedding, FaceMatch, FaceCluster, ImageUpload
+
+# Size of one block of the distance matrix in face_graph; each block
+# holds a few temporaries of this size.
+GRAPH_BLOCK_BYTES = 32 * 1024 * 1024
+
+def face_distances(a, b):
+    """
+    Euclidean distances between every row of `a` and every row of `b`,
+    the same metric face_recognition.compare_faces uses.
+    """
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    squared = (
+        np.einsum('ij,ij->i', a, a)[:, None]
+        + np.einsum('ij,ij->i', b, b)[None, :]
+        - 2 * (a @ b.T)
+    )
+    return np.sqrt(np.maximum(squared, 0))
+
+def assign_clusters(encodings, representatives, threshold):
+    """
+    Match each encoding to its nearest representative within `threshold`.
+
+    Returns (labels, leaders): labels[i] < len(representatives) points at
+    an existing cluster; larger values are new clusters, numbered in
+    order, whose first face is encodings[leaders[j]]. Faces that match no
+    existing cluster are grouped greedily around new leaders.
+    """
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+    existing = len(representatives)
+    labels = np.full(len(encodings), -1, dtype=np.int64)
+
+    if existing and len(encodings):
+        distances = face_distances(encodings, representatives)
+        nearest = np.argmin(distances, axis=1)
+        matched = distances[np.arange(len(encodings)), nearest] <= threshold
+        labels[matched] = nearest[matched]
+
+    pending = np.flatnonzero(labels < 0)
+    unassigned = np.ones(len(pending), dtype=bool)
+    leaders = []
+
+    for i in range(len(pending)):
+        if not unassigned[i]:
+            continue
+        members = unassigned & (face_distances(encodings[pending[i]][None], encodings[pending])[0] <= threshold)
+        labels[pending[members]] = existing + len(leaders)
+        unassigned &= ~members
+        leaders.append(pending[i])
+
+    return labels, leaders
+
+def load_cluster_representatives(user):
+    """
+    Return (cluster_ids, matrix) holding the persisted centroid of every
+    cluster of `user`, loaded in one query.
+    """
+    rows = list(
+        FaceCluster.objects
+        .filter(user=user, centroid__isnull=False)
+        .order_by('id')
+        .values_list('id', 'centroid')
+    )
+    cluster_ids = [cluster_id for cluster_id, _ in rows]
+    matrix = np.array([centroid for _, centroid in rows], dtype=np.float32).reshape(-1, 128)
+    return cluster_ids, matrix
+
+def _sum_by_cluster(cluster_ids, encodings):
+    deltas = {}
+    for cluster_id, encoding in zip(cluster_ids, encodings):
+        total, count = deltas.get(cluster_id, (0, 0))
+        deltas[cluster_id] = (total + np.asarray(encoding, dtype=np.float64), count + 1)
+    return deltas
+
+def update_centroids(deltas, sign=1):
+    """
+    Fold per-cluster (sum, count) deltas into the stored running means.
+    `sign=-1` removes the faces again. A cluster whose count drops to
+    zero keeps its last centroid so restored faces find it again.
+    Must run inside a transaction.
+    """
+    if not deltas:
+        return
+
+    clusters = list(FaceCluster.objects.select_for_update().filter(id__in=deltas).order_by('id'))
+    for cluster in clusters:
+        total, count = deltas[cluster.id]
+        members = cluster.member_count + sign * count
+        if members > 0 and cluster.centroid is not None:
+            current = np.asarray(cluster.centroid, dtype=np.float64) * cluster.member_count
+            cluster.centroid = ((current + sign * total) / members).tolist()
+        elif members > 0:
+            cluster.centroid = (total / count).tolist()
+        cluster.member_count = max(0, members)
+
+    FaceCluster.objects.bulk_update(clusters, ['centroid', 'member_count'])
+
+def _image_cluster_deltas(image_ids):
+    rows = list(
+        FaceMatch.objects
+        .filter(image_id__in=image_ids, embedding__isnull=False)
+        .values_list('cluster_id', 'embedding__encoding')
+    )
+    return _sum_by_cluster([row[0] for row in rows], [unpack_encoding(row[1]) for row in rows])
+
+def remove_image_from_clusters(image):
+    """Take the faces of a binned image out of their cluster centroids."""
+    with transaction.atomic():
+        update_centroids(_image_cluster_deltas([image.id]), sign=-1)
+        bump_face_groups(image.user_id)
+
+def add_image_to_clusters(image):
+    """Put the faces of a restored image back into their cluster centroids."""
+    with transaction.atomic():
+        update_centroids(_image_cluster_deltas([image.id]))
+        bump_face_groups(image.user_id)
+
+def delete_empty_clusters(cluster_ids):
+    FaceCluster.objects.filter(id__in=cluster_ids, facematch__isnull=True).delete()
+
+def cluster_user_faces(user, threshold=0.5):
+    """
+    Assign every unclustered FaceEmbedding of `user` to a FaceCluster and
+    fold the faces into the cluster centroids. The user row is locked for
+    the duration so the API and the analysis workers never cluster the
+    same faces twice.
+    """
+    with transaction.atomic():
+        User.objects.select_for_update().get(pk=user.pk)
+
+        new_embeddings = list(
+            FaceEmbedding.objects
+            .filter(clustered=False, image__user=user)
+            .order_by('id')
+            .values_list('id', 'image_id', 'encoding', 'image__is_deleted')
+        )
+        if not new_embeddings:
+            return
+
+        embedding_ids, image_ids, blobs, deleted = zip(*new_embeddings)
+        encodings = unpack_encodings(blobs)
+        cluster_ids, representatives = load_cluster_representatives(user)
+        labels, leaders = assign_clusters(encodings, representatives, threshold)
+        labels = labels.tolist()
+        existing = len(cluster_ids)
+
+        # Binned images still join a cluster but only count once restored.
+        live = [i for i, is_deleted in enumerate(deleted) if not is_deleted]
+        live_sums = _sum_by_cluster([labels[i] for i in live], [encodings[i] for i in live])
+
+        created = []
+        for offset, leader in enumerate(leaders):
+            total, count = live_sums.get(existing + offset, (None, 0))
+            centroid = total / count if count else np.asarray(encodings[leader], dtype=np.float64)
+            created.append(FaceCluster(user=user, centroid=centroid.tolist(), member_count=count))
+        created = FaceCluster.objects.bulk_create(created)
+
+        update_centroids({cluster_ids[label]: delta for label, delta in live_sums.items() if label < existing})
+        cluster_ids = cluster_ids + [cluster.id for cluster in created]
+
+        FaceMatch.objects.bulk_create([
+            FaceMatch(cluster_id=cluster_ids[label], image_id=image_id, embedding_id=embedding_id)
+            for label, image_id, embedding_id in zip(labels, image_ids, embedding_ids)
+        ])
+        FaceEmbedding.objects.filter(id__in=embedding_ids).update(clustered=True)
+        bump_face_groups(user.id)
+
+    generate_face_thumbnails(FaceEmbedding.objects.filter(id__in=embedding_ids))
+
+def face_graph(encodings, threshold, block_size=None):
+    """
+    Build the graph linking every pair of faces within `threshold` as CSR
+    arrays (indptr, indices). Distances are computed a block of rows at a
+    time; by default the block is sized so one block x n float32 matrix
+    stays within GRAPH_BLOCK_BYTES.
+    """
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+    rows, cols = [], []
+    if block_size is None:
+        block_size = max(1, min(2048, GRAPH_BLOCK_BYTES // (4 * max(1, len(encodings)))))
+
+    for start in range(0, len(encodings), block_size):
+        near = face_distances(encodings[start:start + block_size], encodings) <= threshold
+        block_rows, block_cols = np.nonzero(near)
+        block_rows += start
+        not_self = block_rows != block_cols
+        rows.append(block_rows[not_self])
+        cols.append(block_cols[not_self])
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    indices = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+    indptr = np.searchsorted(rows, np.arange(len(encodings) + 1))
+    return indptr, indices
+
+def chinese_whispers(encodings, threshold=0.5, iterations=20, seed=0):
+    """
+    Cluster faces with Chinese whispers (the algorithm dlib uses for
+    face clustering): every face starts in its own cluster and repeatedly
+    adopts the most common cluster among its neighbours, until nothing
+    changes. Returns cluster labels numbered from 0.
+    """
+    indptr, indices = face_graph(encodings, threshold)
+    count = len(indptr) - 1
+    labels = np.arange(count)
+    rng = np.random.default_rng(seed)
+
+    for _ in range(iterations):
+        changed = False
+        for node in rng.permutation(count):
+            neighbours = indices[indptr[node]:indptr[node + 1]]
+            if not len(neighbours):
+                continue
+            values, votes = np.unique(labels[neighbours], return_counts=True)
+            best = values[np.argmax(votes)]
+            if best != labels[node]:
+                labels[node] = best
+                changed = True
+        if not changed:
+            break
+
+    return np.unique(labels, return_inverse=True)[1]
+
+def load_user_faces(user):
+    """
+    Return (embedding_ids, image_ids, encodings, deleted) arrays for all
+    faces of `user`; `encodings` is the memory-mapped embedding matrix.
+    """
+    embedding_ids, image_ids, encodings = load_user_embeddings(user.id)
+    binned = ImageUpload.objects.filter(user=user, is_deleted=True).values_list('id', flat=True)
+    deleted = np.isin(image_ids, list(binned))
+    return embedding_ids, image_ids, encodings, deleted
+
+def _carry_names(user, embedding_ids, labels):
+    """
+    Map new cluster labels to the names of the old clusters they overlap
+    most, one old cluster per new one, largest overlaps first.
+    """
+    label_of = dict(zip(embedding_ids, labels))
+    overlaps = {}
+    for cluster_id, name, embedding_id in (
+        FaceMatch.objects
+        .filter(image__user=user, embedding__isnull=False)
+        .exclude(cluster__name='')
+        .values_list('cluster_id', 'cluster__name', 'embedding_id')
+    ):
+        if embedding_id in label_of:
+            key = (cluster_id, name, label_of[embedding_id])
+            overlaps[key] = overlaps.get(key, 0) + 1
+
+    names = {}
+    used = set()
+    for (cluster_id, name, label), _ in sorted(overlaps.items(), key=lambda item: -item[1]):
+        if cluster_id not in used and label not in names:
+            names[label] = name
+            used.add(cluster_id)
+    return names
+
+def recluster_user_faces(user, faces, threshold=0.5, dry_run=False):
+    """
+    Re-cluster all `faces` (arrays from `load_user_faces`) of `user` from
+    scratch and replace the user's clusters in one transaction. Names of
+    old clusters carry over to the new cluster they overlap most.
+    Returns (cluster_count, named_count).
+    """
+    embedding_ids, image_ids, encodings, _ = faces
+    labels = chinese_whispers(encodings, threshold)
+    embedding_ids = [int(pk) for pk in embedding_ids]
+    names = _carry_names(user, embedding_ids, labels.tolist())
+    cluster_count = int(labels.max()) + 1 if len(labels) else 0
+
+    if dry_run:
+        return cluster_count, len(names)
+
+    with transaction.atomic():
+        User.objects.select_for_update().get(pk=user.pk)
+        # Binning and restoring take the same lock; re-read the flags so
+        # images binned since `faces` was loaded do not count as live.
+        binned = ImageUpload.objects.filter(user=user, is_deleted=True).values_list('id', flat=True)
+        live = ~np.isin(image_ids, list(binned))
+
+        FaceMatch.objects.filter(image__user=user).delete()
+        FaceCluster.objects.filter(user=user).delete()
+        FaceCluster.objects.filter(user__isnull=True, facematch__isnull=True).delete()
+
+        clusters = []
+        for label in range(cluster_count):
+            members = labels == label
+            counted = members & live
+            centroid = np.asarray(encodings[counted if counted.any() else members], dtype=np.float64).mean(axis=0)
+            clusters.append(FaceCluster(
+                user=user,
+                name=names.get(label, ''),
+                centroid=centroid.tolist(),
+                member_count=int(counted.sum())
+            ))
+        clusters = FaceCluster.objects.bulk_create(clusters)
+
+        FaceMatch.objects.bulk_create([
+            FaceMatch(cluster_id=clusters[label].id, image_id=image_id, embedding_id=embedding_id)
+            for embedding_id, image_id, label in zip(embedding_ids, np.asarray(image_ids).tolist(), labels.tolist())
+        ], batch_size=5000)
+
+        # Faces stored after `faces` was loaded go to the next incremental run.
+        user_embeddings = FaceEmbedding.objects.filter(image__user=user)
+        user_embeddings.filter(id__in=embedding_ids).update(clustered=True)
+        user_embeddings.exclude(id__in=embedding_ids).update(clustered=False)
+        bump_face_groups(user.id)
+
+    return cluster_count, len(names)
@@ -0,0 +1,314 @@
+# imageapp/editing.py
+import hashlib
+import math
+import numpy as np
+from PIL import Image, ImageOps
+from .adjustments import saturation_matrix, sharpen
+from .encoding import encode_image
+from .image_cache import chain_prefixes, decoded_images
+
+# (mirror first, clockwise quarter turns) -> single PIL transpose
+TRANSPOSE_METHODS = {
+    (False, 1): Image.Transpose.ROTATE_270,
+    (False, 2): Image.Transpose.ROTATE_180,
+    (False, 3): Image.Transpose.ROTATE_90,
+    (True, 0): Image.Transpose.FLIP_LEFT_RIGHT,
+    (True, 1): Image.Transpose.TRANSVERSE,
+    (True, 2): Image.Transpose.FLIP_TOP_BOTTOM,
+    (True, 3): Image.Transpose.TRANSPOSE,
+}
+
+def slider_factor(value):
+    """Slider values run from -100 to 100; 0 leaves the image unchanged."""
+    return (value + 100) / 100
+
+class Transpose:
+    """Mirror (optional) followed by a clockwise rotation in quarter turns."""
+    pointwise = False
+
+    def __init__(self, mirror=False, steps=0):
+        self.mirror = mirror
+        self.steps = steps % 4
+
+    def then(self, other):
+        # A mirror flips the direction of the rotation that came before it.
+        steps = other.steps - self.steps if other.mirror else self.steps + other.steps
+        return Transpose(self.mirror != other.mirror, steps)
+
+    def apply(self, img, scale=1.0):
+        method = TRANSPOSE_METHODS.get((self.mirror, self.steps))
+        return img.transpose(method) if method is not None else img
+
+    def key(self):
+        return f'transpose:{int(self.mirror)}:{self.steps}'
+
+class Rotate:
+    """Rotation by an angle that is not a quarter turn; resamples."""
+    pointwise = False
+
+    def __init__(self, degrees):
+        self.degrees = degrees
+
+    def apply(self, img, scale=1.0):
+        return img.rotate(-self.degrees, expand=True)
+
+    def key(self):
+        return f'rotate:{self.degrees}'
+
+class Crop:
+    """Crop box in full-resolution pixels of the oriented image."""
+    pointwise = False
+
+    def __init__(self, x, y, width, height):
+        self.box = (x, y, x + width, y + height)
+
+    def apply(self, img, scale=1.0):
+        return img.crop(tuple(round(value * scale) for value in self.box))
+
+    def key(self):
+        return 'crop:' + ','.join(str(value) for value in self.box)
+
+class Grayscale:
+    pointwise = True
+
+    def apply(self, img, scale=1.0):
+        # Stays single-channel for the rest of the chain; a third of the work.
+        return ImageOps.grayscale(img) if img.mode != 'L' else img
+
+    def key(self):
+        return 'grayscale'
+
+class Tone:
+    """
+    Brightness and contrast steps fused into one lookup table. Contrast
+    pivots around the mean luminance, as ImageEnhance.Contrast does; the
+    mean is taken from one histogram pushed through the preceding steps.
+    Brightness matches the enhancer exactly; on RGB images the contrast
+    pivot can be one level off, as ImageEnhance rounds luminance per pixel.
+    """
+    pointwise = True
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def lookup_table(self, img):
+        values = list(range(256))
+        histogram = None
+
+        for kind, factor in self.steps:
+            # Image.blend works in float32 and truncates.
+            factor = np.float32(factor)
+            if kind == 'brightness':
+                values = [value * factor for value in values]
+            else:
+                if histogram is None:
+                    histogram = img.histogram()
+                mean = int(self._mean_luminance(histogram, values, img.mode) + 0.5)
+                values = [mean + (value - mean) * factor for value in values]
+            # Every step clips, like running the enhancers one by one.
+            values = [min(255, max(0, int(value))) for value in values]
+
+        return values
+
+    @staticmethod
+    def _mean_luminance(histogram, values, mode):
+        # Luminance is a weighted sum of the channels, so its mean is the
+        # same weighted sum of the per-channel means.
+        weights = (1.0,) if mode == 'L' else (0.299, 0.587, 0.114)
+        mean = 0.0
+        for band, weight in enumerate(weights):
+            counts = histogram[band * 256:(band + 1) * 256]
+            total = sum(counts) or 1
+            mean += weight * sum(count * values[i] for i, count in enumerate(counts)) / total
+        return mean
+
+    def apply(self, img, scale=1.0):
+        return img.point(self.lookup_table(img) * len(img.getbands()))
+
+    def key(self):
+        return 'tone:' + ','.join(f'{kind}={factor}' for kind, factor in self.steps)
+
+class Enhance:
+    """
+    Saturation and sharpness in one pass each, without the degenerate
+    image and blended copy ImageEnhance makes: saturation is a channel
+    mix, sharpness one 3x3 kernel pass (see adjustments.py).
+    """
+    pointwise = True
+    kinds = ('saturation', 'sharpness')
+
+    def __init__(self, kind, factor):
+        self.kind = kind
+        self.factor = factor
+
+    def apply(self, img, scale=1.0):
+        if self.kind == 'saturation':
+            return img.convert('RGB', saturation_matrix(self.factor)) if img.mode == 'RGB' else img
+
+        return sharpen(img, self.factor)
+
+    def key(self):
+        return f'{self.kind}:{self.factor}'
+
+def parse_edit(edit):
+    """
+    Turn one chain entry ('rotate:90', 'mirror', 'grayscale',
+    'brightness:20', 'contrast:-10', 'saturation:5', 'sharpness:30',
+    'crop:x,y,width,height') into an operation. Raises ValueError.
+    """
+    name, _, argument = str(edit).partition(':')
+
+    if name == 'mirror':
+        return Transpose(mirror=True)
+    if name == 'grayscale':
+        return Grayscale()
+    if name == 'rotate':
+        degrees = int(argument)
+        return Transpose(steps=degrees // 90) if degrees % 90 == 0 else Rotate(degrees)
+    if name in ('brightness', 'contrast'):
+        return Tone([(name, slider_factor(float(argument)))])
+    if name in Enhance.kinds:
+        return Enhance(name, slider_factor(float(argument)))
+    if name == 'crop':
+        x, y, width, height = (int(value) for value in argument.split(','))
+        return Crop(x, y, width, height)
+
+    raise ValueError(f'Unknown edit: {edit}')
+
+def _is_noop(op):
+    if isinstance(op, Transpose):
+        return not op.mirror and op.steps == 0
+    if isinstance(op, Tone):
+        return all(factor == 1 for _, factor in op.steps)
+    if isinstance(op, Enhance):
+        return op.factor == 1
+    return False
+
+def fuse(ops):
+    """
+    Rewrite a chain into fewer, cheaper operations with the same result:
+
+    - mirrors and quarter turns collapse into one transpose, also across
+      pixel-wise operations, which do not care about orientation;
+    - consecutive brightness/contrast steps become one lookup table;
+    - saturation after grayscale is dropped, as is a repeated grayscale;
+    - operations that change nothing are dropped.
+    """
+    fused = []
+    transpose_at = None
+    gray = False
+
+    for op in ops:
+        if isinstance(op, Transpose):
+            # Merged into the first transpose of the run, so the fused
+            # chain keeps a stable prefix when only later sliders change.
+            if transpose_at is None:
+                transpose_at = len(fused)
+                fused.append(op)
+            else:
+                fused[transpose_at] = fused[transpose_at].then(op)
+            continue
+
+        if not op.pointwise:
+            transpose_at = None
+
+        if isinstance(op, Grayscale):
+            if gray:
+                continue
+            gray = True
+        elif isinstance(op, Enhance) and op.kind == 'saturation' and gray:
+            continue
+        elif isinstance(op, Tone) and fused and isinstance(fused[-1], Tone):
+            fused[-1] = Tone(fused[-1].steps + op.steps)
+            continue
+
+        fused.append(op)
+
+    return [op for op in fused if not _is_noop(op)]
+
+def parse_chain(edits):
+    return fuse([parse_edit(edit) for edit in edits])
+
+def _decode(path):
+    with Image.open(path) as img:
+        return ImageOps.exif_transpose(img).convert('RGB')
+
+def open_image(path):
+    """
+    Return `path` as an EXIF-oriented RGB image, from the decoded-image
+    cache when possible. The result is shared: do not modify it in place.
+    """
+    return decoded_images.get(path, None, lambda: _decode(path))
+
+def open_proxy(path, max_side):
+    """
+    Decode `path` with its long edge reduced to at most `max_side`.
+    JPEGs are decoded straight at a reduced DCT scale (1/2, 1/4 or 1/8),
+    so a 48 MP file never gets decoded at full size. Returns the
+    EXIF-oriented RGB proxy and its scale relative to the original.
+    """
+    return decoded_images.get(path, ('proxy', max_side), lambda: _decode_proxy(path, max_side))
+
+def forget_image(path):
+    """Drop every cached decode and preview intermediate of `path`."""
+    decoded_images.invalidate(path)
+    chain_prefixes.invalidate(path)
+
+def _decode_proxy(path, max_side):
+    with Image.open(path) as img:
+        full_side = max(img.size)
+        if full_side > max_side:
+            ratio = max_side / full_side
+            img.draft('RGB', (math.ceil(img.width * ratio), math.ceil(img.height * ratio)))
+        proxy = ImageOps.exif_transpose(img).convert('RGB')
+
+    if max(proxy.size) > max_side:
+        proxy.thumbnail((max_side, max_side), Image.BILINEAR)
+    return proxy, max(proxy.size) / full_side
+
+def render(img, ops, scale=1.0):
+    for op in ops:
+        img = op.apply(img, scale)
+    return img
+
+def render_file(path, edits):
+    """Decode `path` once, run the whole chain and return it encoded as an edit."""
+    return encode_image(render(open_image(path), parse_chain(edits)), 'edit')
+
+def chain_digest(ops):
+    """Hash of a parsed chain; chains that fuse to the same operations share it."""
+    digest = hashlib.sha1()
+    for op in ops:
+        digest.update(op.key().encode() + b'|')
+    return digest.hexdigest()
+
+def render_incremental(path, max_side, img, ops, scale):
+    """
+    Render `ops` on the proxy of `path`, starting from the longest chain
+    prefix already rendered for it. Every intermediate result is cached
+    under a running hash of the ops so far, so when only the tail of the
+    chain changes (a slider moving) only the tail is applied again.
+    """
+    digest = hashlib.sha1()
+    keys = []
+    for op in ops:
+        digest.update(op.key().encode() + b'|')
+        keys.append(chain_prefixes.file_key(path, (max_side, digest.hexdigest())))
+
+    start = 0
+    for done in range(len(ops), 0, -1):
+        cached = chain_prefixes.lookup(keys[done - 1])
+        if cached is not None:
+            img, start = cached, done
+            break
+
+    for op, key in zip(ops[start:], keys[start:]):
+        img = op.apply(img, scale)
+        chain_prefixes.store(key, img)
+    return img
+
+def render_preview(path, edits, max_side, fmt=None):
+    """Run the chain on a proxy whose long edge is at most `max_side`."""
+    ops = parse_chain(edits)
+    proxy, scale = open_proxy(path, max_side)
+    return encode_image(render_incremental(path, max_side, proxy, ops, scale), 'preview', fmt)
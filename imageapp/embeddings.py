@@ -0,0 +1,108 @@
+# imageapp/embeddings.py
+import fcntl
+import os
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+from .models import FaceEmbedding
+
+DIM = 128
+
+def pack_encoding(encoding):
+    """Store a face encoding as 128 little-endian float32 values (512 bytes)."""
+    return np.asarray(encoding, dtype='<f4').reshape(DIM).tobytes()
+
+def unpack_encoding(data):
+    return np.frombuffer(data, dtype='<f4')
+
+def unpack_encodings(blobs):
+    """Stack packed encodings into an (n, 128) float32 matrix in one copy."""
+    blobs = [bytes(blob) for blob in blobs]
+    return np.frombuffer(b''.join(blobs), dtype='<f4').reshape(-1, DIM)
+
+def _paths(user_id):
+    base = os.path.join(settings.FACE_EMBEDDINGS_DIR, f'user_{user_id}')
+    return base + '.f32', base + '.ids', base + '.lock'
+
+def _file_rows(vectors_path, ids_path):
+    if not (os.path.exists(vectors_path) and os.path.exists(ids_path)):
+        return None
+    rows = os.path.getsize(vectors_path) // (DIM * 4)
+    # A crash between the two appends leaves the files out of step.
+    if os.path.getsize(ids_path) != rows * 16 or os.path.getsize(vectors_path) != rows * DIM * 4:
+        return None
+    return rows
+
+def _last_id(ids_path, rows):
+    if not rows:
+        return 0
+    with open(ids_path, 'rb') as f:
+        f.seek((rows - 1) * 16)
+        return int(np.frombuffer(f.read(8), dtype='<i8')[0])
+
+def _fetch(user_id, after_id=0):
+    rows = list(
+        FaceEmbedding.objects
+        .filter(image__user_id=user_id, id__gt=after_id)
+        .order_by('id')
+        .values_list('id', 'image_id', 'encoding')
+    )
+    ids = np.array([(pk, image_id) for pk, image_id, _ in rows], dtype='<i8').reshape(-1, 2)
+    return ids, unpack_encodings(blob for _, _, blob in rows)
+
+def _write(vectors_path, ids_path, ids, vectors, mode):
+    with open(vectors_path, mode) as f:
+        f.write(vectors.tobytes())
+    with open(ids_path, mode) as f:
+        f.write(ids.tobytes())
+
+def sync_user_embeddings(user_id):
+    """
+    Bring the user's embedding files up to date with the database. Rows
+    are kept in id order, so new faces are appended; anything else (a
+    deletion, a damaged file) rewrites both files. Staleness is checked
+    with one aggregate query on (count, max id). Call with the lock held.
+    """
+    vectors_path, ids_path, _ = _paths(user_id)
+    stats = FaceEmbedding.objects.filter(image__user_id=user_id).aggregate(count=Count('id'), max_id=Max('id'))
+    count, max_id = stats['count'], stats['max_id'] or 0
+
+    rows = _file_rows(vectors_path, ids_path)
+    if rows is not None:
+        last_id = _last_id(ids_path, rows)
+        if rows == count and last_id == max_id:
+            return
+        if max_id > last_id:
+            ids, vectors = _fetch(user_id, after_id=last_id)
+            if rows + len(ids) == count:
+                _write(vectors_path, ids_path, ids, vectors, 'ab')
+                return
+
+    ids, vectors = _fetch(user_id)
+    _write(vectors_path + '.tmp', ids_path + '.tmp', ids, vectors, 'wb')
+    # Replacing keeps matrices that are already mapped valid.
+    os.replace(vectors_path + '.tmp', vectors_path)
+    os.replace(ids_path + '.tmp', ids_path)
+
+def load_user_embeddings(user_id):
+    """
+    Return (embedding_ids, image_ids, matrix) for every face of the user.
+    The matrix is a read-only memory map of user_<id>.f32 in FACE_EMBEDDINGS_DIR,
+    so loading a whole face set does not copy or parse anything.
+    """
+    os.makedirs(settings.FACE_EMBEDDINGS_DIR, exist_ok=True)
+    vectors_path, ids_path, lock_path = _paths(user_id)
+
+    with open(lock_path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            sync_user_embeddings(user_id)
+            rows = _file_rows(vectors_path, ids_path)
+            if not rows:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, DIM), dtype=np.float32)
+            ids = np.fromfile(ids_path, dtype='<i8').reshape(-1, 2)
+            vectors = np.memmap(vectors_path, dtype='<f4', mode='r', shape=(rows, DIM))
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    return ids[:, 0], ids[:, 1], vectors
@@ -0,0 +1,35 @@
+# imageapp/encoding.py
+from io import BytesIO
+from django.conf import settings
+
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+
+def encoder_options(purpose, fmt=None):
+    """
+    (format, save options) for `purpose` from settings.ENCODER_POLICIES.
+    Without `fmt` the purpose's first format is used. Raises KeyError for
+    a format the purpose does not offer.
+    """
+    policy = settings.ENCODER_POLICIES[purpose]
+    fmt = fmt or next(iter(policy))
+    return fmt, policy[fmt]
+
+def encode_image(img, purpose, fmt=None):
+    fmt, options = encoder_options(purpose, fmt)
+    buffer = BytesIO()
+    img.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+def save_image(img, path, purpose, fmt=None):
+    fmt, options = encoder_options(purpose, fmt)
+    img.save(path, format=fmt, **options)
+
+def accepts(request, fmt):
+    return CONTENT_TYPES[fmt] in request.META.get('HTTP_ACCEPT', '')
+
+def negotiate_format(request, purpose):
+    """WebP when the client lists image/webp in Accept and the purpose offers it."""
+    if 'WEBP' in settings.ENCODER_POLICIES[purpose] and accepts(request, 'WEBP'):
+        return 'WEBP'
+    return encoder_options(purpose)[0]
@@ -0,0 +1,53 @@
+# imageapp/face_groups.py
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.cache import cache
+from django.db.models import F, Min, Q
+from .models import FaceGroupVersion, FaceMatch
+
+def face_groups_version(user_id):
+    return FaceGroupVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+def bump_face_groups(user_id):
+    """
+    Invalidate the cached face groups of a user. Call it in the same
+    transaction as the change so the new version and the new data become
+    visible together.
+    """
+    if not FaceGroupVersion.objects.filter(user_id=user_id).update(version=F('version') + 1):
+        FaceGroupVersion.objects.get_or_create(user_id=user_id, defaults={'version': 1})
+
+def build_face_groups(user_id):
+    """
+    One aggregated query: every cluster with live images, its distinct
+    image ids and the oldest face that has a stored box (for the
+    thumbnail).
+    """
+    rows = (
+        FaceMatch.objects
+        .filter(image__user_id=user_id, image__is_deleted=False)
+        .values('cluster_id', 'cluster__name')
+        .annotate(
+            image_ids=ArrayAgg('image_id', distinct=True, ordering='image_id'),
+            thumbnail_id=Min('embedding_id', filter=Q(embedding__location__isnull=False)),
+        )
+        .order_by('cluster_id')
+    )
+    return [
+        {
+            'id': row['cluster_id'],
+            'image_ids': row['image_ids'],
+            'name': row['cluster__name'] or 'Unknown',
+            'thumbnail_id': row['thumbnail_id'],
+        }
+        for row in rows
+    ]
+
+def get_face_groups(user_id):
+    """Face groups of a user, served from the cache while the version holds."""
+    key = f'face-groups:{user_id}:{face_groups_version(user_id)}'
+    groups = cache.get(key)
+    if groups is None:
+        groups = build_face_groups(user_id)
+        cache.set(key, groups, settings.FACE_GROUPS_CACHE_TIMEOUT)
+    return groups
@@ -0,0 +1,284 @@
+# imageapp/face_index.py
+import math
+import threading
+import numpy as np
+from django.conf import settings
+from .embeddings import load_user_embeddings
+from .models import FaceEmbedding
+
+DIM = 128
+
+class FaceIndex:
+    """
+    In-memory nearest-neighbour index over one user's face embeddings.
+
+    Vectors live in a contiguous float32 matrix (grown by doubling) with
+    parallel arrays mapping each row to its FaceEmbedding and image id.
+    Removed rows are tombstoned and compacted away once they pile up.
+    Large indexes also get an IVF structure (k-means coarse quantizer):
+    a search then only scans the rows of the `nprobe` nearest lists.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.dead = 0
+        self.vectors = np.empty((0, DIM), dtype=np.float32)
+        self.norms = np.empty(0, dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.image_ids = np.empty(0, dtype=np.int64)
+        self.alive = np.empty(0, dtype=bool)
+        self.positions = {}
+
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.trained_size = 0
+        self._lists = None
+
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self.size - self.dead
+
+    def _grow(self, extra):
+        needed = self.size + extra
+        if needed <= len(self.ids):
+            return
+
+        capacity = max(needed, len(self.ids) * 2, 1024)
+
+        def resized(array):
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        self.vectors = resized(self.vectors)
+        self.norms = resized(self.norms)
+        self.ids = resized(self.ids)
+        self.image_ids = resized(self.image_ids)
+        self.alive = resized(self.alive)
+        self.assignments = resized(self.assignments)
+
+    def add(self, ids, image_ids, vectors):
+        with self.lock:
+            vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, DIM)
+            keep = [i for i, pk in enumerate(ids) if pk not in self.positions]
+            if not keep:
+                return
+
+            ids = np.asarray(ids, dtype=np.int64)[keep]
+            image_ids = np.asarray(image_ids, dtype=np.int64)[keep]
+            vectors = vectors[keep]
+
+            self._grow(len(ids))
+            start, end = self.size, self.size + len(ids)
+            self.vectors[start:end] = vectors
+            self.norms[start:end] = np.einsum('ij,ij->i', vectors, vectors)
+            self.ids[start:end] = ids
+            self.image_ids[start:end] = image_ids
+            self.alive[start:end] = True
+            if self.centroids is not None:
+                self.assignments[start:end] = self._nearest_centroids(vectors)
+                self._lists = None
+
+            for row, pk in enumerate(ids.tolist(), start):
+                self.positions[pk] = row
+            self.size = end
+
+    def remove(self, ids):
+        with self.lock:
+            for pk in ids:
+                row = self.positions.pop(pk, None)
+                if row is not None:
+                    self.alive[row] = False
+                    self.dead += 1
+
+            if self.dead > max(1024, self.size // 4):
+                self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive[:self.size])
+        self.vectors = np.ascontiguousarray(self.vectors[keep])
+        self.norms = self.norms[keep]
+        self.ids = self.ids[keep]
+        self.image_ids = self.image_ids[keep]
+        self.alive = self.alive[keep]
+        self.assignments = self.assignments[keep]
+        self.positions = {pk: row for row, pk in enumerate(self.ids.tolist())}
+        self.size = len(keep)
+        self.dead = 0
+        self._lists = None
+
+    def _distances(self, query, rows=None):
+        vectors = self.vectors[:self.size] if rows is None else self.vectors[rows]
+        norms = self.norms[:self.size] if rows is None else self.norms[rows]
+        squared = norms - 2 * (vectors @ query) + query @ query
+        return np.sqrt(np.maximum(squared, 0))
+
+    def _nearest_centroids(self, vectors):
+        squared = (
+            np.einsum('ij,ij->i', self.centroids, self.centroids)[None, :]
+            - 2 * (vectors @ self.centroids.T)
+        )
+        return np.argmin(squared, axis=1).astype(np.int32)
+
+    def train(self, nlist=None, iterations=10, sample_size=20000, seed=0):
+        """
+        Fit the IVF coarse quantizer with k-means on a sample of the
+        live vectors, then assign every row to its nearest list.
+        """
+        with self.lock:
+            live = np.flatnonzero(self.alive[:self.size])
+            if len(live) == 0:
+                return
+
+            nlist = nlist or max(1, int(math.sqrt(len(live))))
+            rng = np.random.default_rng(seed)
+            sample = self.vectors[rng.choice(live, size=min(sample_size, len(live)), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+
+            for _ in range(iterations):
+                self.centroids = centroids
+                nearest = self._nearest_centroids(sample)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, nearest, sample)
+                counts = np.bincount(nearest, minlength=len(centroids))
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+
+            self.centroids = centroids
+            self.assignments[:self.size] = self._nearest_centroids(self.vectors[:self.size])
+            self.trained_size = len(live)
+            self._lists = None
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            order = np.argsort(self.assignments[:self.size], kind='stable')
+            bounds = np.searchsorted(self.assignments[:self.size][order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    def _use_ivf(self):
+        if len(self) < settings.FACE_INDEX_IVF_MIN_SIZE:
+            return False
+        if self.centroids is None or len(self) > 2 * self.trained_size:
+            self.train()
+        return True
+
+    def search(self, query, k=10, nprobe=None, exclude_ids=()):
+        """
+        Return up to `k` (embedding_id, image_id, distance) tuples for the
+        rows closest to `query`, nearest first.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(DIM)
+
+        with self.lock:
+            if len(self) == 0:
+                return []
+
+            rows = None
+            if self._use_ivf():
+                nprobe = nprobe or settings.FACE_INDEX_IVF_NPROBE
+                order, bounds = self._inverted_lists()
+                probe = np.argsort(self._nearest_centroid_distances(query))[:nprobe]
+                rows = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probe])
+
+            distances = self._distances(query, rows)
+            alive = self.alive[:self.size] if rows is None else self.alive[rows]
+            distances[~alive] = np.inf
+            if exclude_ids:
+                row_ids = self.ids[:self.size] if rows is None else self.ids[rows]
+                distances[np.isin(row_ids, list(exclude_ids))] = np.inf
+
+            count = min(k, len(distances))
+            if count == 0:
+                return []
+            best = np.argpartition(distances, count - 1)[:count]
+            best = best[np.argsort(distances[best])]
+            best = best[np.isfinite(distances[best])]
+            found = best if rows is None else rows[best]
+
+            return [
+                (int(self.ids[row]), int(self.image_ids[row]), float(distances[i]))
+                for i, row in zip(best, found)
+            ]
+
+    def _nearest_centroid_distances(self, query):
+        return np.einsum('ij,ij->i', self.centroids, self.centroids) - 2 * (self.centroids @ query)
+
+    def refresh(self, user_id):
+        """
+        Bring the index in line with the user's memory-mapped embedding
+        file. bulk_create sends no signals, and workers write from other
+        processes, so changes are found by comparing ids rather than
+        pushed. Workers commit out of order, so a new row may have a
+        lower id than rows already indexed: unless count, max id and id
+        sum all match, the id sets are diffed.
+        """
+        ids, image_ids, vectors = load_user_embeddings(user_id)
+        with self.lock:
+            indexed = self.ids[:self.size][self.alive[:self.size]]
+            if (
+                len(ids) == len(indexed)
+                and (not len(ids) or ids[-1] == indexed.max())
+                and int(ids.sum()) == int(indexed.sum())
+            ):
+                return
+
+            gone = indexed[~np.isin(indexed, ids)]
+            if len(gone):
+                self.remove(gone.tolist())
+            new = ~np.isin(ids, indexed)
+            if new.any():
+                self.add(ids[new].tolist(), image_ids[new], vectors[new])
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_face_index(user_id):
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = FaceIndex()
+    index.refresh(user_id)
+    return index
+
+def forget_embeddings(ids):
+    """
+    Drop deleted embeddings from every loaded index in this process.
+    Other processes find out lazily when results are checked against the
+    database in `find_similar_faces`.
+    """
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.remove(ids)
+
+def find_similar_faces(user, encoding, k=20, exclude_ids=(), max_distance=None):
+    """
+    Return the `k` images whose faces are closest to `encoding`, as
+    dicts with the best matching embedding and its distance.
+    """
+    index = get_face_index(user.id)
+    candidates = index.search(encoding, k=k * 3 + 10, exclude_ids=exclude_ids)
+    if max_distance is not None:
+        candidates = [c for c in candidates if c[2] <= max_distance]
+
+    ids = [c[0] for c in candidates]
+    deleted_image = dict(
+        FaceEmbedding.objects
+        .filter(id__in=ids)
+        .values_list('id', 'image__is_deleted')
+    )
+    index.remove([pk for pk in ids if pk not in deleted_image])
+    live = {pk for pk, deleted in deleted_image.items() if not deleted}
+
+    results = []
+    seen_images = set()
+    for embedding_id, image_id, distance in candidates:
+        if embedding_id not in live or image_id in seen_images:
+            continue
+        seen_images.add(image_id)
+        results.append({'image_id': image_id, 'embedding_id': embedding_id, 'distance': round(distance, 4)})
+        if len(results) == k:
+            break
+    return results
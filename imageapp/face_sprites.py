@@ -0,0 +1,139 @@
+# imageapp/face_sprites.py
+import json
+import os
+import threading
+from PIL import Image
+from django.conf import settings
+from .encoding import save_image
+from .face_groups import face_groups_version, get_face_groups
+from .face_thumbnails import face_thumbnail_path
+
+BACKGROUND = (32, 32, 32)
+
+def _sprite_paths(user_id):
+    base = os.path.join(settings.MEDIA_ROOT, 'sprites', f'user_{user_id}')
+    return base + '.jpg', base + '.json'
+
+def _cell_source(group):
+    if group['thumbnail_id']:
+        path = face_thumbnail_path(group['thumbnail_id'])
+        if os.path.exists(path):
+            return path
+    # Embeddings stored before boxes were kept only have the per-image thumbnail.
+    legacy = os.path.join(settings.MEDIA_ROOT, 'uploads', f"face_{group['image_ids'][0]}.jpg")
+    return legacy if os.path.exists(legacy) else None
+
+def _load_manifest(manifest_path, sprite_path):
+    if not (os.path.exists(manifest_path) and os.path.exists(sprite_path)):
+        return None
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('cell') != settings.FACE_THUMBNAIL_SIZE or manifest.get('columns') != settings.FACE_SPRITE_COLUMNS:
+        return None
+    return manifest
+
+def _describe(manifest, user_id):
+    cell, columns = manifest['cell'], manifest['columns']
+    offsets = {
+        cluster_id: [slot % columns * cell, slot // columns * cell]
+        for cluster_id, (slot, _) in manifest['slots'].items()
+    }
+    return {
+        'sprite': f"{settings.MEDIA_URL}sprites/user_{user_id}.jpg?v={manifest['version']}",
+        'version': manifest['version'],
+        'cell': cell,
+        'width': manifest['width'],
+        'height': manifest['height'],
+        'offsets': offsets,
+    }
+
+def build_face_sprite(user_id):
+    """
+    Return the user's face sprite sheet: one JPEG with every cluster's
+    thumbnail on a fixed grid, and the (x, y) offset of each cluster.
+
+    The sheet is rebuilt incrementally. A manifest next to it records the
+    slot and source of every cell and the face-groups version it was made
+    for; when the version moved, clusters whose thumbnail is unchanged
+    keep their cell, and only new or changed clusters are decoded and
+    pasted, reusing slots freed by removed clusters first.
+    """
+    sprite_path, manifest_path = _sprite_paths(user_id)
+    version = face_groups_version(user_id)
+    manifest = _load_manifest(manifest_path, sprite_path)
+    # Thumbnails are rendered just after clustering commits, so a sheet
+    # made in between is retried until every cluster has its cell.
+    if manifest and manifest['version'] == version and not manifest.get('incomplete'):
+        return _describe(manifest, user_id)
+
+    cell, columns = settings.FACE_THUMBNAIL_SIZE, settings.FACE_SPRITE_COLUMNS
+    all_groups = [(str(group['id']), _cell_source(group)) for group in get_face_groups(user_id)]
+    groups = [(cluster_id, source) for cluster_id, source in all_groups if source]
+
+    old_slots = manifest['slots'] if manifest else {}
+    # Rebuild from scratch once most of the sheet is dead space.
+    if len(old_slots) > 2 * len(groups) + columns:
+        old_slots = {}
+
+    wanted = dict(groups)
+    slots = {
+        cluster_id: (slot, source)
+        for cluster_id, (slot, source) in old_slots.items()
+        if wanted.get(cluster_id) == source
+    }
+    used = {slot for slot, _ in slots.values()}
+    free = (slot for slot in range(len(groups) + len(old_slots)) if slot not in used)
+    changed = []
+    for cluster_id, source in groups:
+        if cluster_id not in slots:
+            slots[cluster_id] = (next(free), source)
+            changed.append(cluster_id)
+
+    removed = {slot for slot, _ in old_slots.values()} - {slot for slot, _ in slots.values()}
+    redraw = bool(changed or removed or not old_slots)
+
+    rows = max(1, (max((slot for slot, _ in slots.values()), default=0) // columns) + 1)
+    width, height = columns * cell, rows * cell
+    if redraw:
+        sheet = Image.new('RGB', (width, height), BACKGROUND)
+        if old_slots:
+            with Image.open(sprite_path) as previous:
+                sheet.paste(previous.convert('RGB').crop((0, 0, width, min(height, previous.height))), (0, 0))
+
+        # Blank the cells of removed clusters so their faces do not linger.
+        for slot in removed:
+            x, y = slot % columns * cell, slot // columns * cell
+            sheet.paste(BACKGROUND, (x, y, x + cell, y + cell))
+
+        for cluster_id in changed:
+            slot, source = slots[cluster_id]
+            with Image.open(source) as face:
+                face = face.convert('RGB').resize((cell, cell), Image.LANCZOS)
+            sheet.paste(face, (slot % columns * cell, slot // columns * cell))
+
+    manifest = {
+        'version': version,
+        'cell': cell,
+        'columns': columns,
+        'width': width,
+        'height': height,
+        'slots': slots,
+        'incomplete': len(groups) < len(all_groups),
+    }
+
+    os.makedirs(os.path.dirname(sprite_path), exist_ok=True)
+    # Concurrent rebuilds for the same user each write their own temp files.
+    suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+    if redraw:
+        # Cells sit on the 16px JPEG block grid, so re-encoding leaves the
+        # untouched cells practically unchanged.
+        save_image(sheet, sprite_path + suffix, 'sprite')
+        os.replace(sprite_path + suffix, sprite_path)
+    with open(manifest_path + suffix, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + suffix, manifest_path)
+
+    return _describe(manifest, user_id)
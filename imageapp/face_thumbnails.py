@@ -0,0 +1,99 @@
+# imageapp/face_thumbnails.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from django.conf import settings
+from .encoding import save_image
+
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def face_thumbnail_path(embedding_id):
+    return os.path.join(settings.MEDIA_ROOT, 'faces', f'{embedding_id}.jpg')
+
+def face_thumbnail_url(embedding_id):
+    return f'{settings.MEDIA_URL}faces/{embedding_id}.jpg'
+
+def _crop_box(location, width, height):
+    """Square crop around a (top, right, bottom, left) box, with padding."""
+    top, right, bottom, left = location
+    side = max(bottom - top, right - left) * (1 + 2 * settings.FACE_THUMBNAIL_PADDING)
+    center_x, center_y = (left + right) / 2, (top + bottom) / 2
+    side = min(side, width, height)
+    x = min(max(0, center_x - side / 2), width - side)
+    y = min(max(0, center_y - side / 2), height - side)
+    return x, y, x + side, y + side
+
+def render_face_thumbnails(path, faces):
+    """
+    Write one thumbnail per (embedding_id, location) in `faces`, all cut
+    from a single decode of the image at `path`. Locations are in the
+    EXIF-transposed full-resolution frame. JPEGs are decoded at the
+    smallest DCT scale that still gives every crop its full thumbnail
+    size.
+    """
+    size = settings.FACE_THUMBNAIL_SIZE
+
+    with Image.open(path) as img:
+        width, height = img.size
+        if img.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+
+        crops = [(embedding_id, _crop_box(location, width, height)) for embedding_id, location in faces]
+        smallest = min(box[2] - box[0] for _, box in crops)
+        reduce = max(1.0, smallest / size)
+        img.draft('RGB', (int(img.size[0] / reduce), int(img.size[1] / reduce)))
+
+        decoded = ImageOps.exif_transpose(img).convert('RGB')
+
+    scale_x, scale_y = decoded.width / width, decoded.height / height
+    for embedding_id, (left, top, right, bottom) in crops:
+        face = decoded.crop((
+            round(left * scale_x), round(top * scale_y),
+            round(right * scale_x), round(bottom * scale_y),
+        )).resize((size, size), Image.LANCZOS)
+        save_image(face, face_thumbnail_path(embedding_id), 'face_thumbnail')
+
+def _render_image(path, faces):
+    try:
+        render_face_thumbnails(path, faces)
+        return len(faces)
+    except Exception as e:
+        print(f"[Thumbnail] Could not render faces of {path}: {e}")
+        return 0
+
+def generate_face_thumbnails(embeddings, workers=None):
+    """
+    Make sure every embedding in the `embeddings` queryset has a thumbnail.
+    Faces are grouped per image so each image is decoded once, and images
+    are rendered in a thread pool (decoding and resizing release the GIL).
+    Stored boxes are used as they are; faces are never re-detected.
+    """
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'faces'), exist_ok=True)
+
+    by_image = {}
+    for embedding_id, location, path in (
+        embeddings
+        .filter(location__isnull=False)
+        .values_list('id', 'location', 'image__image')
+    ):
+        if not os.path.exists(face_thumbnail_path(embedding_id)):
+            by_image.setdefault(path, []).append((embedding_id, location))
+
+    if not by_image:
+        return 0
+
+    workers = workers or settings.FACE_THUMBNAIL_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rendered = pool.map(
+            _render_image,
+            [os.path.join(settings.MEDIA_ROOT, path) for path in by_image],
+            list(by_image.values())
+        )
+        return sum(rendered)
+
+def delete_face_thumbnails(embedding_ids):
+    for embedding_id in embedding_ids:
+        path = face_thumbnail_path(embedding_id)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,67 @@
+# imageapp/faces.py
+import numpy as np
+from PIL import Image
+from django.conf import settings
+from .ml import get_model
+
+def has_person(labels):
+    return 'person' in labels
+
+def prepare_detection_image(rgb, max_side=None):
+    """
+    Return a copy of `rgb` whose long edge is at most `max_side`, and the
+    scale factor that was applied. Detection runs on this copy.
+    """
+    max_side = max_side or settings.FACE_DETECTION_MAX_SIDE
+    height, width = rgb.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+
+    if scale == 1.0:
+        return rgb, scale
+
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    small = Image.fromarray(rgb).resize(size, Image.BILINEAR)
+    return np.asarray(small), scale
+
+def locate_faces(small, scale, shape):
+    """
+    Detect faces on the downscaled image and map the boxes back to the
+    full-resolution (top, right, bottom, left) coordinates.
+    """
+    face_recognition = get_model('face_recognition')
+    locations = face_recognition.face_locations(
+        small,
+        number_of_times_to_upsample=settings.FACE_DETECTION_UPSAMPLE,
+        model=settings.FACE_DETECTION_MODEL
+    )
+
+    height, width = shape[:2]
+    boxes = []
+    for top, right, bottom, left in locations:
+        boxes.append((
+            max(0, int(top / scale)),
+            min(width, int(right / scale)),
+            min(height, int(bottom / scale)),
+            max(0, int(left / scale)),
+        ))
+    return boxes
+
+def find_faces(rgb, labels=None, prepared=None):
+    """
+    Return (locations, encodings) for the faces in `rgb`.
+
+    Detection is skipped entirely when `labels` are given and YOLO found
+    no person. Faces are located on a downscaled copy (`prepared` may hold
+    one made earlier) and encoded on the full-resolution image, only
+    inside the detected boxes.
+    """
+    if labels is not None and settings.FACE_REQUIRE_PERSON and not has_person(labels):
+        return [], []
+
+    small, scale = prepared or prepare_detection_image(rgb)
+    locations = locate_faces(small, scale, rgb.shape)
+    if not locations:
+        return [], []
+
+    encodings = get_model('face_recognition').face_encodings(rgb, locations)
+    return locations, encodings
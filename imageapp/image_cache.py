@@ -0,0 +1,95 @@
+# imageapp/image_cache.py
+import os
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+class DecodedImageCache:
+    """
+    Per-process LRU cache of decoded PIL images, bounded by their pixel
+    memory rather than by count.
+
+    Entries are keyed by (path, mtime, file size, variant), so a file that
+    is rewritten in place is never served stale; `invalidate` frees the
+    entries of a file that was replaced or removed. Cached images are
+    shared between requests and must not be modified in place; every
+    edit operation returns a new image.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _nbytes(value):
+        img = value[0] if isinstance(value, tuple) else value
+        return img.width * img.height * len(img.getbands())
+
+    @staticmethod
+    def file_key(path, variant):
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, variant)
+
+    def lookup(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def store(self, key, value):
+        nbytes = self._nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = value
+                self.size += nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= self._nbytes(evicted)
+                self.evictions += 1
+
+    def get(self, path, variant, load):
+        """Return the cached value for `path`/`variant`, calling `load()` on a miss."""
+        key = self.file_key(path, variant)
+        value = self.lookup(key)
+        if value is None:
+            value = load()
+            self.store(key, value)
+        return value
+
+    def invalidate(self, path):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == path]:
+                self.size -= self._nbytes(self.entries.pop(key))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+decoded_images = DecodedImageCache(settings.DECODED_IMAGE_CACHE_BYTES)
+
+# Intermediate results of preview edit chains, keyed by chain prefix
+chain_prefixes = DecodedImageCache(settings.EDIT_PREFIX_CACHE_BYTES)
@@ -0,0 +1,182 @@
+# imageapp/jobs.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from .analysis import (
+    analyze_batch, analyze_image, find_analysis_donor, find_analysis_donors,
+    reuse_analysis, save_analysis, save_analysis_batch,
+)
+from .clustering import cluster_user_faces
+from .models import AnalysisJob
+
+def enqueue_analysis_batch(images, claim=False):
+    """
+    Queue `images` with a single insert. Images whose bytes were already
+    analysed get the stored results copied right away and their job is
+    born done. With `claim`, the other jobs are created as running so the
+    caller can process them itself with `run_jobs`.
+    """
+    donors = find_analysis_donors(images)
+    now = timezone.now()
+    reused = []
+    jobs = []
+
+    for image in images:
+        donor = donors.get(image.content_hash)
+        if donor is not None:
+            result = reuse_analysis(donor)
+            reused.append((image, result))
+            jobs.append(AnalysisJob(image=image, status=AnalysisJob.DONE, timings=result['timings'], finished_at=now))
+        elif claim:
+            jobs.append(AnalysisJob(image=image, status=AnalysisJob.RUNNING, attempts=1, started_at=now))
+        else:
+            jobs.append(AnalysisJob(image=image))
+
+    with transaction.atomic():
+        save_analysis_batch(reused)
+        return AnalysisJob.objects.bulk_create(jobs)
+
+def enqueue_analysis(image):
+    return enqueue_analysis_batch([image])[0]
+
+def claim_job():
+    """
+    Take the oldest pending job, or return None when the queue is empty.
+    SKIP LOCKED lets any number of workers poll the same table.
+    """
+    with transaction.atomic():
+        job = (
+            AnalysisJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=AnalysisJob.PENDING)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = AnalysisJob.RUNNING
+        job.attempts += 1
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'attempts', 'started_at'])
+    return job
+
+def requeue_stale_jobs():
+    """
+    Put back jobs whose worker died mid-run, or fail them once they
+    have used up their attempts.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.ANALYSIS_JOB_TIMEOUT)
+    stale = AnalysisJob.objects.filter(status=AnalysisJob.RUNNING, started_at__lt=cutoff)
+    stale.filter(attempts__lt=settings.ANALYSIS_MAX_ATTEMPTS).update(status=AnalysisJob.PENDING)
+    stale.update(
+        status=AnalysisJob.FAILED,
+        error='Worker timed out',
+        finished_at=timezone.now()
+    )
+
+def run_job(job):
+    image = job.image
+    try:
+        donor = find_analysis_donor(image)
+        result = reuse_analysis(donor) if donor else analyze_image(image)
+        timings = result['timings']
+        start = time.perf_counter()
+        with transaction.atomic():
+            save_analysis(image, result)
+            timings['save_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            job.status = AnalysisJob.DONE
+            job.error = ''
+            job.timings = timings
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'timings', 'finished_at'])
+        print(f"[Analysis] Image {image.id}: {timings}")
+    except Exception as e:
+        print(f"[Analysis] Job {job.id} failed for Image {image.id}: {e}")
+        job.error = str(e)
+        if job.attempts < settings.ANALYSIS_MAX_ATTEMPTS:
+            job.status = AnalysisJob.PENDING
+        else:
+            job.status = AnalysisJob.FAILED
+            job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return
+
+    try:
+        cluster_user_faces(image.user)
+    except Exception as e:
+        print(f"[Analysis] Clustering failed for Image {image.id}: {e}")
+
+def run_jobs(jobs):
+    """
+    Analyse claimed (running) jobs together and store every successful
+    result in one transaction, then cluster each affected user once.
+    """
+    running = [job for job in jobs if job.status == AnalysisJob.RUNNING]
+    results = analyze_batch([job.image for job in running])
+    finished_at = timezone.now()
+    saved = []
+
+    for job, result in zip(running, results):
+        if isinstance(result, Exception):
+            print(f"[Analysis] Job {job.id} failed for Image {job.image_id}: {result}")
+            job.error = str(result)
+            if job.attempts < settings.ANALYSIS_MAX_ATTEMPTS:
+                job.status = AnalysisJob.PENDING
+            else:
+                job.status = AnalysisJob.FAILED
+                job.finished_at = finished_at
+            continue
+
+        saved.append((job.image, result))
+        job.status = AnalysisJob.DONE
+        job.error = ''
+        job.timings = result['timings']
+        job.finished_at = finished_at
+
+    with transaction.atomic():
+        save_analysis_batch(saved)
+        AnalysisJob.objects.bulk_update(running, ['status', 'error', 'timings', 'finished_at'])
+
+    for user in {job.image.user for job in jobs}:
+        try:
+            cluster_user_faces(user)
+        except Exception as e:
+            print(f"[Analysis] Clustering failed for user {user.id}: {e}")
+
+def _worker_loop(poll_interval, once):
+    try:
+        while True:
+            close_old_connections()
+            job = claim_job()
+
+            if job is None:
+                if once:
+                    return
+                requeue_stale_jobs()
+                time.sleep(poll_interval)
+                continue
+
+            run_job(job)
+    finally:
+        connection.close()
+
+def run_worker(poll_interval=None, once=False, threads=None):
+    """
+    Drain the queue with `threads` concurrent jobs in this process, so
+    their YOLO calls can be batched together by the InferenceBatcher.
+    """
+    poll_interval = poll_interval or settings.ANALYSIS_POLL_INTERVAL
+    threads = threads or settings.ANALYSIS_WORKER_THREADS
+
+    if threads == 1:
+        _worker_loop(poll_interval, once)
+        return
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(_worker_loop, poll_interval, once) for _ in range(threads)]
+        for future in futures:
+            future.result()
@@ -0,0 +1,57 @@
+# imageapp/labels.py
+from django.db.models import Count, Q
+from .models import ImageLabel
+
+def normalize_label(label):
+    return label.strip().lower()
+
+def replace_image_labels(images):
+    """
+    Rewrite the ImageLabel rows of `images` from their `labels` field.
+    """
+    rows = [
+        ImageLabel(image=image, user_id=image.user_id, name=name, is_deleted=image.is_deleted)
+        for image in images
+        for name in {normalize_label(label) for label in image.labels if label.strip()}
+    ]
+    ImageLabel.objects.filter(image__in=images).delete()
+    ImageLabel.objects.bulk_create(rows)
+
+def set_labels_deleted(image, deleted):
+    ImageLabel.objects.filter(image=image).update(is_deleted=deleted)
+
+def _term_filter(term, match):
+    if match == 'prefix':
+        return Q(name__startswith=term)
+    return Q(name=term)
+
+def search_image_ids(user, terms, match='prefix', op='and'):
+    """
+    Return a queryset of image ids whose labels match `terms`.
+    `match` is 'exact' or 'prefix'; `op` is 'and' (every term must match
+    one of the image's labels) or 'or' (any term).
+    """
+    terms = [normalize_label(term) for term in terms if term.strip()]
+    labels = ImageLabel.objects.filter(user=user, is_deleted=False)
+
+    if op == 'or':
+        condition = Q()
+        for term in terms:
+            condition |= _term_filter(term, match)
+        return labels.filter(condition).values('image_id').distinct()
+
+    image_ids = None
+    for term in terms:
+        matching = labels.filter(_term_filter(term, match)).values('image_id')
+        image_ids = matching if image_ids is None else matching.filter(image_id__in=image_ids)
+    return image_ids
+
+def label_facets(user, prefix=None):
+    labels = ImageLabel.objects.filter(user=user, is_deleted=False)
+    if prefix:
+        labels = labels.filter(name__startswith=normalize_label(prefix))
+    return list(
+        labels.values('name')
+        .annotate(count=Count('name'))
+        .order_by('-count', 'name')
+    )
@@ -0,0 +1,51 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connection
+from imageapp.models import ImageUpload
+from imageapp.renditions import ensure_renditions, renditions_ready
+
+def _render_image(image):
+    try:
+        return image.id, ensure_renditions(image), None
+    except Exception as e:
+        return image.id, False, str(e)
+    finally:
+        connection.close()
+
+class Command(BaseCommand):
+    help = 'Render the downscaled renditions of every image that does not have them yet'
+
+    def add_arguments(self, parser):
+        # Pillow releases the GIL while decoding, resizing and encoding
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+        parser.add_argument('--user', help='Username or id to backfill (default: every user)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        images = ImageUpload.objects.exclude(image='').order_by('-id')
+        if options['user']:
+            value = options['user']
+            images = images.filter(user_id=value) if value.isdigit() else images.filter(user__username=value)
+
+        pending = [
+            image for image in images.only('id', 'image', 'content_hash', 'renditions_key')
+            if not renditions_ready(image)
+        ]
+
+        rendered = missing = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for image_id, done, error in pool.map(_render_image, pending):
+                if error:
+                    failed += 1
+                    print(f"[Renditions] Image {image_id} failed: {error}")
+                elif done:
+                    rendered += 1
+                else:
+                    missing += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} images in {time.perf_counter() - start:.1f}s'
+            f' ({missing} files missing, {failed} failed).'
+        ))
@@ -0,0 +1,391 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SUITES = {}
+
+def suite(name):
+    def register(func):
+        SUITES[name] = func
+        return func
+    return register
+
+def sample_images(directory, limit):
+    extensions = ('.jpg', '.jpeg', '.png', '.webp')
+    paths = sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(extensions)
+    )
+    if not paths:
+        raise CommandError(f'No images found in {directory}')
+    while len(paths) < limit:
+        paths = paths + paths
+    return paths[:limit]
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+@suite('yolo-batch')
+def bench_yolo_batch(command, options):
+    from imageapp.analysis import predict_labels_batch
+
+    paths = sample_images(options['images'], options['count'])
+    predict_labels_batch(paths[:1])
+
+    for batch_size in options['batch_sizes']:
+        start = time.perf_counter()
+        for batch in chunks(paths, batch_size):
+            predict_labels_batch(batch)
+        elapsed = time.perf_counter() - start
+
+        command.stdout.write(
+            f'batch={batch_size:<3} {len(paths) / elapsed:7.1f} img/s'
+            f'  {elapsed / len(paths) * 1000:7.1f} ms/img'
+        )
+
+STARTUP_PROBE = """
+import json, os, resource, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+start = time.perf_counter()
+import django
+django.setup()
+import imageapp.urls
+imported = time.perf_counter() - start
+if sys.argv[1] == 'warm':
+    from imageapp.ml import warm_models
+    warm_models()
+print(json.dumps({
+    'import_s': imported,
+    'total_s': time.perf_counter() - start,
+    'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+@suite('startup')
+def bench_startup(command, options):
+    for mode in ('cold', 'warm'):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_PROBE, mode],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        command.stdout.write(
+            f'{mode:<5} import {result["import_s"]:6.2f}s  total {result["total_s"]:6.2f}s'
+            f'  max RSS {result["maxrss_mb"]:7.1f} MB'
+        )
+
+def box_iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return inter / float(area_a + area_b - inter) if inter else 0.0
+
+@suite('faces')
+def bench_faces(command, options):
+    """Compare full-resolution HOG against the gated, downscaled pipeline."""
+    import numpy as np
+    from imageapp.analysis import load_rgb, predict_labels_batch
+    from imageapp.faces import find_faces
+    from imageapp.ml import get_model
+
+    face_recognition = get_model('face_recognition')
+    paths = sorted(set(sample_images(options['images'], options['count'])))
+    full_time = fast_time = 0.0
+    reference_faces = matched = 0
+    distances = []
+
+    for path in paths:
+        rgb = load_rgb(path)
+        labels = predict_labels_batch([np.ascontiguousarray(rgb[:, :, ::-1])])[0]
+
+        start = time.perf_counter()
+        full_locations = face_recognition.face_locations(rgb)
+        full_encodings = face_recognition.face_encodings(rgb, full_locations)
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast_locations, fast_encodings = find_faces(rgb, labels)
+        fast_time += time.perf_counter() - start
+
+        reference_faces += len(full_locations)
+        for location, encoding in zip(full_locations, full_encodings):
+            candidates = [
+                (box_iou(location, fast_location), fast_encoding)
+                for fast_location, fast_encoding in zip(fast_locations, fast_encodings)
+            ]
+            overlap, fast_encoding = max(candidates, key=lambda c: c[0], default=(0.0, None))
+            if overlap >= 0.5:
+                matched += 1
+                distances.append(float(np.linalg.norm(encoding - fast_encoding)))
+
+    count = len(paths)
+    command.stdout.write(f'images: {count}  faces (full-res reference): {reference_faces}')
+    command.stdout.write(f'full-res  {full_time / count * 1000:8.1f} ms/img')
+    command.stdout.write(f'fast      {fast_time / count * 1000:8.1f} ms/img'
+                         f'  ({full_time / max(fast_time, 1e-9):.1f}x)')
+    if reference_faces:
+        command.stdout.write(f'recall    {matched / reference_faces:.1%}'
+                             f'  mean encoding distance {np.mean(distances) if distances else 0:.4f}')
+
+def synthetic_faces(count, seed=0):
+    """Clustered 128-d vectors: ~20 faces per identity, like a photo library."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    identities = rng.normal(0, 0.06, size=(max(1, count // 20), 128)).astype(np.float32)
+    owners = rng.integers(0, len(identities), size=count)
+    return identities[owners] + rng.normal(0, 0.02, size=(count, 128)).astype(np.float32)
+
+@suite('face-index')
+def bench_face_index(command, options):
+    import numpy as np
+    from django.test import override_settings
+    from imageapp.face_index import FaceIndex
+
+    queries = 200
+    for size in (10_000, 100_000):
+        vectors = synthetic_faces(size)
+        ids = np.arange(1, size + 1)
+
+        start = time.perf_counter()
+        index = FaceIndex()
+        for batch in chunks(range(size), 1000):
+            index.add(ids[batch.start:batch.stop], ids[batch.start:batch.stop], vectors[batch.start:batch.stop])
+        build = time.perf_counter() - start
+
+        probes = vectors[np.random.default_rng(1).choice(size, queries, replace=False)]
+        with override_settings(FACE_INDEX_IVF_MIN_SIZE=size + 1):
+            start = time.perf_counter()
+            exact = [{r[0] for r in index.search(q, k=10)} for q in probes]
+            exact_ms = (time.perf_counter() - start) / queries * 1000
+
+        with override_settings(FACE_INDEX_IVF_MIN_SIZE=1):
+            start = time.perf_counter()
+            index.train()
+            train = time.perf_counter() - start
+
+            start = time.perf_counter()
+            approx = [{r[0] for r in index.search(q, k=10)} for q in probes]
+            ivf_ms = (time.perf_counter() - start) / queries * 1000
+
+        recall = np.mean([len(a & e) / len(e) for a, e in zip(approx, exact)])
+        command.stdout.write(
+            f'{size:>7} faces  build {build * 1000:7.1f} ms  exact {exact_ms:6.2f} ms/query'
+            f'  ivf {ivf_ms:6.2f} ms/query (train {train:.2f}s, recall@10 {recall:.3f})'
+        )
+
+def synthetic_photo(path, width, height, seed=0):
+    """A smooth gradient with noise, so the JPEG decodes like a real photo."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    rgb = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    rgb += rng.normal(0, 12, size=(height, width, 1)).astype(np.float32)
+    Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8)).save(path, quality=90)
+
+EDIT_CHAIN = ['rotate:90', 'brightness:10', 'contrast:15', 'saturation:20']
+
+@suite('edit-preview')
+def bench_edit_preview(command, options):
+    """Full-resolution chain render against the proxy preview path."""
+    import itertools
+    import statistics
+    import tempfile
+    from imageapp.editing import render_file, render_preview
+    from imageapp.image_cache import chain_prefixes, decoded_images
+
+    preview_size = 1600
+    with tempfile.TemporaryDirectory() as directory:
+        for megapixels, (width, height) in ((12, (4000, 3000)), (48, (8000, 6000))):
+            path = os.path.join(directory, f'{megapixels}mp.jpg')
+            synthetic_photo(path, width, height)
+
+            # A sharpness slider being dragged: only the last value changes.
+            drag = (EDIT_CHAIN + [f'sharpness:{value}'] for value in itertools.count(1))
+            timings = {}
+            for mode, render, cold in (
+                ('full', lambda: render_file(path, EDIT_CHAIN), True),
+                ('preview', lambda: render_preview(path, EDIT_CHAIN, preview_size), True),
+                ('cached', lambda: render_preview(path, EDIT_CHAIN, preview_size), False),
+                ('replay', lambda: render_preview(path, next(drag), preview_size), False),
+                ('slider', lambda: render_preview(path, next(drag), preview_size), False),
+            ):
+                runs = []
+                for _ in range(5):
+                    if cold:
+                        decoded_images.clear()
+                    if mode != 'slider':
+                        chain_prefixes.clear()
+                    start = time.perf_counter()
+                    render()
+                    runs.append(time.perf_counter() - start)
+                timings[mode] = statistics.median(runs)
+
+            command.stdout.write(
+                f'{megapixels:>2} MP  full {timings["full"] * 1000:7.0f} ms'
+                f'  preview@{preview_size} {timings["preview"] * 1000:6.0f} ms'
+                f'  ({timings["full"] / timings["preview"]:.1f}x)'
+                f'  cached decode {timings["cached"] * 1000:5.0f} ms'
+                f'  slider replay {timings["replay"] * 1000:5.0f} ms'
+                f' -> tail only {timings["slider"] * 1000:5.0f} ms'
+            )
+        command.stdout.write(f'decoded image cache: {decoded_images.stats()}')
+        command.stdout.write(f'chain prefix cache: {chain_prefixes.stats()}')
+
+ADJUST_SLIDERS = ['brightness:10', 'contrast:15', 'saturation:20', 'sharpness:30']
+
+ADJUST_PROBE = """
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+import django
+django.setup()
+from PIL import ImageEnhance
+from imageapp.editing import _decode, parse_chain, render, slider_factor
+
+img = _decode(sys.argv[2])
+sliders = [edit.split(':') for edit in sys.argv[3:]]
+enhancers = {
+    'brightness': ImageEnhance.Brightness, 'contrast': ImageEnhance.Contrast,
+    'saturation': ImageEnhance.Color, 'sharpness': ImageEnhance.Sharpness,
+}
+ops = parse_chain(sys.argv[3:])
+
+def status_kb(field):
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+# Reset the peak RSS so decoding the input does not count (Linux only).
+with open('/proc/self/clear_refs', 'w') as f:
+    f.write('5')
+baseline = status_kb('VmRSS:')
+start = time.perf_counter()
+if sys.argv[1] == 'enhance':
+    out = img
+    for name, value in sliders:
+        out = enhancers[name](out).enhance(slider_factor(float(value)))
+else:
+    out = render(img, ops)
+print(json.dumps({
+    'ms': (time.perf_counter() - start) * 1000,
+    'peak_mb': (status_kb('VmHWM:') - baseline) / 1024,
+}))
+"""
+
+@suite('adjust')
+def bench_adjust(command, options):
+    """ImageEnhance one slider at a time against the single-pass slider ops."""
+    import statistics
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        for megapixels, (width, height) in ((12, (4000, 3000)), (48, (8000, 6000))):
+            path = os.path.join(directory, f'{megapixels}mp.jpg')
+            synthetic_photo(path, width, height)
+
+            results = {}
+            for mode in ('enhance', 'single-pass'):
+                # A fresh process per run, so the peak RSS is this run's alone.
+                runs = [
+                    json.loads(subprocess.run(
+                        [sys.executable, '-c', ADJUST_PROBE, mode, path] + ADJUST_SLIDERS,
+                        cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+                    ).stdout.strip().splitlines()[-1])
+                    for _ in range(3)
+                ]
+                results[mode] = (
+                    statistics.median(run['ms'] for run in runs),
+                    statistics.median(run['peak_mb'] for run in runs),
+                )
+
+            (enhance_ms, enhance_mb), (single_ms, single_mb) = results['enhance'], results['single-pass']
+            command.stdout.write(
+                f'{megapixels:>2} MP  ImageEnhance {enhance_ms:6.0f} ms {enhance_mb:6.0f} MB peak'
+                f'  single-pass {single_ms:6.0f} ms {single_mb:6.0f} MB peak'
+                f'  ({enhance_ms / single_ms:.1f}x)'
+            )
+
+def psnr(a, b):
+    import numpy as np
+
+    error = np.mean((np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32)) ** 2)
+    return float('inf') if error == 0 else 10 * np.log10(255 ** 2 / error)
+
+@suite('encoders')
+def bench_encoders(command, options):
+    """Bytes, encode time and quality of every ENCODER_POLICIES entry against Pillow defaults."""
+    import statistics
+    import tempfile
+    from io import BytesIO
+    from PIL import Image
+    from imageapp.editing import _decode
+    from imageapp.encoding import encode_image
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'photo.jpg')
+        synthetic_photo(path, 4000, 3000)
+        photo = _decode(path)
+
+    proxy = photo.resize((1600, 1200), Image.LANCZOS)
+    sticker = proxy.convert('RGBA')
+    sticker.putalpha(Image.radial_gradient('L').resize(proxy.size).point(lambda value: 255 if value < 128 else 0))
+    sources = {'edit': photo, 'face_thumbnail': proxy.resize((80, 80)), 'sticker': sticker, 'sticker_preview': sticker}
+
+    def measure(img, encode):
+        runs = []
+        for _ in range(3):
+            start = time.perf_counter()
+            data = encode(img)
+            runs.append(time.perf_counter() - start)
+
+        # Quality after one save, and after five saves of the re-decoded result,
+        # which is what happens to an image edited again and again.
+        decoded = Image.open(BytesIO(data)).convert(img.mode)
+        again = decoded
+        for _ in range(4):
+            again = Image.open(BytesIO(encode(again))).convert(img.mode)
+        return len(data), statistics.median(runs) * 1000, psnr(img, decoded), psnr(img, again)
+
+    def pillow_default(fmt):
+        def encode(img):
+            buffer = BytesIO()
+            img.save(buffer, format=fmt)
+            return buffer.getvalue()
+        return encode
+
+    command.stdout.write(f'{"policy":<16}{"format":<6}{"size":>10}{"KB":>10}{"ms":>8}{"PSNR":>8}{"PSNR x5":>9}')
+    for purpose, formats in settings.ENCODER_POLICIES.items():
+        img = sources.get(purpose, proxy)
+        size = f'{img.width}x{img.height}'
+        for fmt in formats:
+            for label, encode in (
+                ('default', pillow_default(fmt)),
+                (purpose, lambda img, fmt=fmt: encode_image(img, purpose, fmt)),
+            ):
+                nbytes, ms, once, five = measure(img, encode)
+                command.stdout.write(
+                    f'{label:<16}{fmt:<6}{size:>10}{nbytes / 1024:10.1f}{ms:8.1f}{once:8.2f}{five:9.2f}'
+                )
+
+class Command(BaseCommand):
+    help = 'Run a local performance benchmark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(SUITES))
+        parser.add_argument('--images', default=os.path.join(settings.MEDIA_ROOT, 'uploads'),
+                            help='Directory with sample images')
+        parser.add_argument('--count', type=int, default=64, help='Number of images to process')
+        parser.add_argument('--batch-sizes', type=lambda value: [int(v) for v in value.split(',')],
+                            default=[1, 4, 8, 16])
+
+    def handle(self, *args, **options):
+        SUITES[options['suite']](self, options)
@@ -1,47 +1,159 @@
 import os
-import face_recognition
+import resource
+import time
+import tracemalloc
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
-from imageapp.models import ImageUpload, FaceCluster, FaceMatch
+from django.db import connections, transaction
+from imageapp.clustering import load_user_faces, recluster_user_faces
+from imageapp.embeddings import pack_encoding
+from imageapp.face_thumbnails import generate_face_thumbnails
+from imageapp.models import AnalysisJob, FaceEmbedding, ImageUpload
+
+# analysis_version of images whose faces this command encoded without a
+# full analysis. It never equals settings.ANALYSIS_VERSION, so such images
+# are not used as analysis donors, but they are not encoded again.
+FACES_ONLY_VERSION = 'faces-only'
+
+def _init_encoder():
+    import django
+    django.setup()
+
+    from imageapp.ml import get_model
+    get_model('face_recognition')
+
+def _encode_image(image_id, path, labels):
+    from imageapp.analysis import load_rgb
+    from imageapp.faces import find_faces
+
+    try:
+        # Empty labels may mean the image was never analysed, so only
+        # skip detection when YOLO labels exist and contain no person.
+        locations, encodings = find_faces(load_rgb(path), labels or None)
+        return image_id, [(list(location), pack_encoding(encoding)) for location, encoding in zip(locations, encodings)], None
+    except Exception as e:
+        return image_id, [], str(e)
+
+def images_missing_faces(user):
+    """
+    Live images that were never analysed and have no analysis queued, so
+    no worker will ever store their face embeddings.
+    """
+    return list(
+        ImageUpload.objects
+        .filter(user=user, is_deleted=False, analysis_version='', face_embeddings__isnull=True)
+        .exclude(analysis_jobs__status__in=[AnalysisJob.PENDING, AnalysisJob.RUNNING])
+        .distinct()
+        .only('id', 'image', 'labels')
+    )
 
 class Command(BaseCommand):
-    help = 'Detect and cluster faces from uploaded images'
+    help = 'Re-cluster faces per user from stored embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username or id to re-cluster (default: every user)')
+        parser.add_argument('--dry-run', action='store_true', help='Report the result without writing')
+        parser.add_argument('--threshold', type=float, default=0.5)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes used to encode images that have no embeddings yet')
 
     def handle(self, *args, **options):
-        known_encodings = []
-        clusters = []
-
-        FaceMatch.objects.all().delete()
-        FaceCluster.objects.all().delete()
-
-        for image in ImageUpload.objects.filter(is_deleted=False):
-            path = image.image.path
-            if not os.path.exists(path):
-                continue
-
-            img = face_recognition.load_image_file(path)
-            face_locations = face_recognition.face_locations(img)
-            face_encodings = face_recognition.face_encodings(img, face_locations)
-
-            for location, encoding in zip(face_locations, face_encodings):
-                matched_cluster = None
-
-                for idx, known in enumerate(known_encodings):
-                    matches = face_recognition.compare_faces(known, encoding)
-                    if any(matches):
-                        matched_cluster = clusters[idx]
-                        break
-
-                if matched_cluster is None:
-                    matched_cluster = FaceCluster.objects.create()
-                    known_encodings.append([encoding])
-                    clusters.append(matched_cluster)
-                else:
-                    known_encodings[clusters.index(matched_cluster)].append(encoding)
-
-                FaceMatch.objects.create(
-                    cluster=matched_cluster,
-                    image=image,
-                    face_location=location
+        users = User.objects.order_by('id')
+        if options['user']:
+            value = options['user']
+            users = users.filter(id=value) if value.isdigit() else users.filter(username=value)
+
+        tracemalloc.start()
+        totals = {'encode': 0.0, 'load': 0.0, 'cluster': 0.0, 'thumbnails': 0.0}
+        started = time.perf_counter()
+
+        for user in users:
+            start = time.perf_counter()
+            added = self.encode_missing(user, options)
+            totals['encode'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            faces = load_user_faces(user)
+            if options['dry_run']:
+                faces = tuple(np.concatenate([column, extra]) for column, extra in zip(faces, added))
+            totals['load'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            clusters, named = recluster_user_faces(
+                user, faces, threshold=options['threshold'], dry_run=options['dry_run']
+            )
+            totals['cluster'] += time.perf_counter() - start
+
+            if not options['dry_run']:
+                start = time.perf_counter()
+                generate_face_thumbnails(FaceEmbedding.objects.filter(image__user=user), workers=options['workers'])
+                totals['thumbnails'] += time.perf_counter() - start
+
+            if len(faces[0]):
+                self.stdout.write(
+                    f'{user.username}: {len(faces[0])} faces -> {clusters} clusters'
+                    f' ({named} names kept, {len(added[0])} faces newly encoded)'
+                )
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        self.stdout.write(
+            ' '.join(f'{stage} {seconds:.2f}s' for stage, seconds in totals.items())
+            + f'  total {time.perf_counter() - started:.2f}s'
+        )
+        self.stdout.write(f'peak traced memory {peak / 2**20:.1f} MB  max RSS {max_rss:.1f} MB')
+        self.stdout.write(self.style.SUCCESS('Dry run complete.' if options['dry_run'] else 'Clustering complete.'))
+
+    def encode_missing(self, user, options):
+        """
+        Encode faces for images without embeddings in a process pool.
+        Returns the new faces in `load_user_faces` form; ids are 0 on a
+        dry run because nothing is stored.
+        """
+        found = {}
+        encoded = []
+        images = [image for image in images_missing_faces(user) if os.path.exists(image.image.path)]
+
+        if images:
+            # Never share the parent's database connection with forked children.
+            connections.close_all()
+
+            with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=_init_encoder) as pool:
+                results = pool.map(
+                    _encode_image,
+                    [image.id for image in images],
+                    [image.image.path for image in images],
+                    [image.labels for image in images],
+                    chunksize=4
+                )
+                for image_id, image_faces, error in results:
+                    if error:
+                        print(f"[Faces] Could not encode image {image_id}: {error}")
+                    else:
+                        encoded.append(image_id)
+                    found[image_id] = image_faces
+
+        faces = [(image_id, location, blob) for image_id, found_faces in found.items() for location, blob in found_faces]
+        ids = [0] * len(faces)
+        if encoded and not options['dry_run']:
+            with transaction.atomic():
+                embeddings = FaceEmbedding.objects.bulk_create([
+                    FaceEmbedding(image_id=image_id, encoding=blob, location=location, clustered=False)
+                    for image_id, location, blob in faces
+                ])
+                # Images without faces would otherwise be encoded again on every run.
+                ImageUpload.objects.filter(id__in=encoded, analysis_version='').update(
+                    analysis_version=FACES_ONLY_VERSION
                 )
+            ids = [embedding.id for embedding in embeddings]
 
-        self.stdout.write(self.style.SUCCESS(f'Clustering complete: {FaceCluster.objects.count()} clusters.'))
+        return (
+            np.array(ids, dtype=np.int64),
+            np.array([image_id for image_id, _, _ in faces], dtype=np.int64),
+            np.frombuffer(b''.join(blob for _, _, blob in faces), dtype='<f4').reshape(-1, 128),
+            np.zeros(len(faces), dtype=bool),
+        )
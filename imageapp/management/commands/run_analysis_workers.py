@@ -0,0 +1,51 @@
+import multiprocessing
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+def _worker_main(poll_interval, once, threads):
+    # Workers are spawned (see handle), so each starts from a fresh
+    # interpreter and sets Django up before touching any model.
+    import django
+    django.setup()
+
+    from imageapp.jobs import run_worker
+    from imageapp.ml import warm_models
+    warm_models(['yolo', 'face_recognition'])
+    run_worker(poll_interval=poll_interval, once=once, threads=threads)
+
+class Command(BaseCommand):
+    help = 'Run a pool of worker processes that drain the image analysis queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.ANALYSIS_WORKERS)
+        parser.add_argument('--threads', type=int, default=settings.ANALYSIS_WORKER_THREADS,
+                            help='Concurrent jobs per process; their YOLO calls are batched')
+        parser.add_argument('--poll', type=float, default=settings.ANALYSIS_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+
+        # Spawn rather than fork, also on Linux: children never inherit the
+        # parent's database connections or the threads of loaded models.
+        context = multiprocessing.get_context('spawn')
+        connections.close_all()
+
+        processes = [
+            context.Process(target=_worker_main, args=(options['poll'], options['once'], options['threads']))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        self.stdout.write(f'Started {workers} analysis workers.')
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+
+        self.stdout.write(self.style.SUCCESS('Analysis workers stopped.'))
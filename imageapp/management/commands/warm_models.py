@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from imageapp.ml import registered_models, warm_models
+
+class Command(BaseCommand):
+    help = 'Load the AI models and run a dummy inference on each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', choices=registered_models(), help='Models to warm (default: all)')
+
+    def handle(self, *args, **options):
+        for name in options['models'] or registered_models():
+            start = time.perf_counter()
+            warm_models([name])
+            self.stdout.write(f'{name}: ready in {time.perf_counter() - start:.2f}s')
+
+        self.stdout.write(self.style.SUCCESS('Models warmed.'))
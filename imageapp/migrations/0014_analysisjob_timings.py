@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imageapp', '0013_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
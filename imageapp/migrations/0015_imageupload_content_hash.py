@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imageapp', '0014_analysisjob_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='analysis_version',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
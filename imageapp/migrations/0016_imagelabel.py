@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_labels(apps, schema_editor):
+    ImageUpload = apps.get_model('imageapp', 'ImageUpload')
+    ImageLabel = apps.get_model('imageapp', 'ImageLabel')
+
+    rows = []
+    for image in ImageUpload.objects.exclude(labels=[]).iterator():
+        names = {label.strip().lower() for label in image.labels if isinstance(label, str) and label.strip()}
+        rows.extend(
+            ImageLabel(image_id=image.id, user_id=image.user_id, name=name, is_deleted=image.is_deleted)
+            for name in names
+        )
+    ImageLabel.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imageapp', '0015_imageupload_content_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_rows', to='imageapp.imageupload')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('is_deleted', False)), fields=['user', 'name'], name='imagelabel_live_user_name', opclasses=['int4_ops', 'varchar_pattern_ops'])],
+                'constraints': [models.UniqueConstraint(fields=('image', 'name'), name='unique_image_label')],
+            },
+        ),
+        migrations.RunPython(backfill_labels, migrations.RunPython.noop),
+    ]
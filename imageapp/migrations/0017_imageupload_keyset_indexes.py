@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imageapp', '0016_imagelabel'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['user', '-uploaded_at', '-id'], name='image_live_user_uploaded'),
+        ),
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['user', '-uploaded_at', '-id'], name='image_bin_user_uploaded'),
+        ),
+    ]
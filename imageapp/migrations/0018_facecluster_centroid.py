@@ -0,0 +1,95 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:35
+
+from itertools import groupby
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_centroids(apps, schema_editor):
+    """
+    Link existing matches to the image embedding closest to the cluster's
+    old representative (first embedding of its first image) and compute
+    each cluster's owner, centroid and member count from those links.
+    """
+    FaceCluster = apps.get_model('imageapp', 'FaceCluster')
+    FaceMatch = apps.get_model('imageapp', 'FaceMatch')
+    FaceEmbedding = apps.get_model('imageapp', 'FaceEmbedding')
+
+    faces_by_image = {}
+    for embedding_id, image_id, encoding in (
+        FaceEmbedding.objects.order_by('image_id', 'id').values_list('id', 'image_id', 'encoding')
+    ):
+        faces_by_image.setdefault(image_id, []).append((embedding_id, np.array(encoding)))
+
+    matches = (
+        FaceMatch.objects
+        .order_by('cluster_id', 'id')
+        .values_list('id', 'cluster_id', 'image_id', 'image__user_id', 'image__is_deleted')
+    )
+    linked = []
+    clusters = []
+
+    for cluster_id, rows in groupby(matches, key=lambda row: row[1]):
+        rows = list(rows)
+        seed = next((faces_by_image[row[2]][0][1] for row in rows if row[2] in faces_by_image), None)
+        if seed is None:
+            continue
+
+        used = set()
+        total = np.zeros_like(seed)
+        count = 0
+        for match_id, _, image_id, _, is_deleted in rows:
+            faces = faces_by_image.get(image_id, [])
+            candidates = [face for face in faces if face[0] not in used] or faces
+            if not candidates:
+                continue
+            embedding_id, encoding = min(candidates, key=lambda face: np.linalg.norm(face[1] - seed))
+            used.add(embedding_id)
+            linked.append(FaceMatch(id=match_id, embedding_id=embedding_id))
+            if not is_deleted:
+                total += encoding
+                count += 1
+
+        centroid = total / count if count else seed
+        clusters.append(FaceCluster(
+            id=cluster_id, user_id=rows[0][3], centroid=centroid.tolist(), member_count=count
+        ))
+
+    FaceMatch.objects.bulk_update(linked, ['embedding'], batch_size=1000)
+    FaceCluster.objects.bulk_update(clusters, ['user', 'centroid', 'member_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imageapp', '0017_imageupload_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facecluster',
+            name='centroid',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='facecluster',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='facecluster',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='facematch',
+            name='embedding',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='imageapp.faceembedding'),
+        ),
+        migrations.RunPython(backfill_centroids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import numpy as np
+
+
+def pack_encodings(apps, schema_editor):
+    FaceEmbedding = apps.get_model('imageapp', 'FaceEmbedding')
+    batch = []
+    for pk, encoding in FaceEmbedding.objects.order_by('id').values_list('id', 'encoding').iterator(chunk_size=2000):
+        batch.append(FaceEmbedding(id=pk, encoding_f32=np.asarray(encoding, dtype='<f4').tobytes()))
+        if len(batch) == 2000:
+            FaceEmbedding.objects.bulk_update(batch, ['encoding_f32'])
+            batch = []
+    FaceEmbedding.objects.bulk_update(batch, ['encoding_f32'])
+
+
+def unpack_encodings(apps, schema_editor):
+    FaceEmbedding = apps.get_model('imageapp', 'FaceEmbedding')
+    batch = []
+    for pk, data in FaceEmbedding.objects.order_by('id').values_list('id', 'encoding_f32').iterator(chunk_size=2000):
+        batch.append(FaceEmbedding(id=pk, encoding=np.frombuffer(data, dtype='<f4').tolist()))
+        if len(batch) == 2000:
+            FaceEmbedding.objects.bulk_update(batch, ['encoding'])
+            batch = []
+    FaceEmbedding.objects.bulk_update(batch, ['encoding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imageapp', '0018_facecluster_centroid'),
+    ]
+
+    operations = [
+        # Nullable first so the migration can be reversed on a filled table.
+        migrations.AlterField(
+            model_name='faceembedding',
+            name='encoding',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='faceembedding',
+            name='encoding_f32',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(pack_encodings, unpack_encodings),
+        migrations.RemoveField(
+            model_name='faceembedding',
+            name='encoding',
+        ),
+        migrations.RenameField(
+            model_name='faceembedding',
+            old_name='encoding_f32',
+            new_name='encoding',
+        ),
+        migrations.AlterField(
+            model_name='faceembedding',
+            name='encoding',
+            field=models.BinaryField(),
+        ),
+    ]
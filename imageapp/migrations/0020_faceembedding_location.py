@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imageapp', '0019_faceembedding_binary_encoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceembedding',
+            name='location',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
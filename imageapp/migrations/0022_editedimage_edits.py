@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imageapp', '0021_facegroupversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='editedimage',
+            name='edits',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='editedimage',
+            name='preview_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imageapp', '0022_editedimage_edits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='renditions_key',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+    ]
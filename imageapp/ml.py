@@ -0,0 +1,80 @@
+# imageapp/ml.py
+import threading
+import numpy as np
+from django.conf import settings
+
+_loaders = {}
+_warmups = {}
+_models = {}
+_lock = threading.Lock()
+
+def register(name, warmup=None):
+    def decorator(loader):
+        _loaders[name] = loader
+        if warmup:
+            _warmups[name] = warmup
+        return loader
+    return decorator
+
+def get_model(name):
+    """
+    Return the model registered as `name`, loading it on first use.
+    Loading happens once per process even when several threads ask at once.
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        if name not in _models:
+            _models[name] = _loaders[name]()
+        return _models[name]
+
+def registered_models():
+    return sorted(_loaders)
+
+def is_loaded(name):
+    return name in _models
+
+def warm_models(names=None):
+    """
+    Load the given models (all of them by default) and run one dummy
+    inference so the first real request does not pay for lazy init.
+    """
+    for name in names or list(_loaders):
+        model = get_model(name)
+        warmup = _warmups.get(name)
+        if warmup:
+            warmup(model)
+
+def _warm_yolo(model):
+    model.predict(source=np.zeros((640, 640, 3), dtype=np.uint8), save=False, verbose=False)
+
+def _warm_face_recognition(face_recognition):
+    img = np.zeros((64, 64, 3), dtype=np.uint8)
+    face_recognition.face_locations(img)
+    face_recognition.face_encodings(img, [(8, 56, 56, 8)])
+
+def _warm_rembg(session):
+    from PIL import Image
+    from rembg import remove
+    remove(Image.new('RGB', (64, 64)), session=session)
+
+@register('yolo', warmup=_warm_yolo)
+def _load_yolo():
+    from ultralytics import YOLO
+    return YOLO(settings.YOLO_WEIGHTS)
+
+@register('face_recognition', warmup=_warm_face_recognition)
+def _load_face_recognition():
+    import face_recognition
+    return face_recognition
+
+@register('rembg', warmup=_warm_rembg)
+def _load_rembg():
+    from rembg import new_session
+    return new_session(settings.REMBG_MODEL)
+
+def remove_background(data):
+    from rembg import remove
+    return remove(data, session=get_model('rembg'))
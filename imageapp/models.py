@@ -8,6 +8,27 @@ class ImageUpload(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     labels = models.JSONField(default=list)
     is_deleted = models.BooleanField(default=False)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    # settings.ANALYSIS_VERSION that produced `labels` and face embeddings
+    # ('faces-only' when cluster_faces encoded the faces without labels)
+    analysis_version = models.CharField(max_length=100, blank=True)
+    # renditions.rendition_key() of the version whose renditions are on disk
+    renditions_key = models.CharField(max_length=16, blank=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination over (uploaded_at, id) for the gallery and the recycle bin
+            models.Index(
+                fields=['user', '-uploaded_at', '-id'],
+                name='image_live_user_uploaded',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=['user', '-uploaded_at', '-id'],
+                name='image_bin_user_uploaded',
+                condition=models.Q(is_deleted=True),
+            ),
+        ]
 
     def __str__(self):
         return f"Image {self.id}"
@@ -17,6 +38,9 @@ class EditedImage(models.Model):
     edited = models.ImageField(upload_to='edited/')
     edited_at = models.DateTimeField(auto_now_add=True)
     temporary = models.BooleanField(default=True)
+    # chain that produced a preview from the original, re-run at full size on save
+    edits = models.JSONField(null=True, blank=True)
+    preview_size = models.PositiveIntegerField(null=True, blank=True)
 
 class ImageRestorePoint(models.Model):
     original = models.OneToOneField(ImageUpload, on_delete=models.CASCADE)
@@ -27,15 +51,25 @@ class ImageRestorePoint(models.Model):
         return f"RestorePoint for Image {self.original.id}"
 
 class FaceCluster(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # running mean of the member faces whose image is not in the recycle bin
+    centroid = ArrayField(models.FloatField(), null=True, blank=True)
+    member_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name or f"Cluster {self.id}"
 
+class FaceGroupVersion(models.Model):
+    # bumped whenever the user's face groups change; keys the cached groups
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+
 class FaceMatch(models.Model):
     cluster = models.ForeignKey(FaceCluster, on_delete=models.CASCADE)
     image = models.ForeignKey(ImageUpload, on_delete=models.CASCADE)
+    embedding = models.ForeignKey('FaceEmbedding', on_delete=models.CASCADE, null=True, blank=True)
     face_location = models.JSONField(null=True, blank=True)
 
 class FaceEncoding(models.Model):
@@ -45,9 +79,65 @@ class FaceEncoding(models.Model):
 
 class FaceEmbedding(models.Model):
     image = models.ForeignKey(ImageUpload, on_delete=models.CASCADE, related_name='face_embeddings')
-    encoding = ArrayField(models.FloatField())  # 128 floats from face_recognition
+    encoding = models.BinaryField()  # 128 float32 values, see embeddings.pack_encoding
+    location = models.JSONField(null=True, blank=True)  # [top, right, bottom, left] in full-resolution pixels
     created_at = models.DateTimeField(auto_now_add=True)
     clustered = models.BooleanField(default=False)  # NEW FIELD
 
     def __str__(self):
         return f"Embedding for Image {self.image.id}"
+
+class AnalysisJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    image = models.ForeignKey(ImageUpload, on_delete=models.CASCADE, related_name='analysis_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    timings = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"AnalysisJob {self.id} for Image {self.image_id} ({self.status})"
+
+class ImageLabel(models.Model):
+    """
+    One row per (image, detected label), kept in sync with
+    ImageUpload.labels so search and facet counts can use an index.
+    """
+    image = models.ForeignKey(ImageUpload, on_delete=models.CASCADE, related_name='label_rows')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    # mirrors image.is_deleted so counts never have to join ImageUpload
+    is_deleted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['image', 'name'], name='unique_image_label'),
+        ]
+        indexes = [
+            # varchar_pattern_ops lets LIKE 'prefix%' use the index too
+            models.Index(
+                fields=['user', 'name'],
+                name='imagelabel_live_user_name',
+                opclasses=['int4_ops', 'varchar_pattern_ops'],
+                condition=models.Q(is_deleted=False),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} on Image {self.image_id}"
@@ -0,0 +1,121 @@
+# imageapp/pagination.py
+import base64
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+from django.utils.encoding import filepath_to_uri
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from .models import ImageUpload
+from .renditions import RenditionLinks, rendition_map
+
+# Fields that can be requested with ?fields=... and served straight from values()
+SPARSE_IMAGE_FIELDS = ('id', 'image', 'uploaded_at', 'labels', 'is_deleted', 'content_hash', 'renditions')
+
+def _row_value(row, field):
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over (-uploaded_at, -id). Each page is one
+    index range scan no matter how deep the client has scrolled.
+
+    Pagination is opt-in: without `cursor` or `page_size` the full list
+    is returned as before, so existing clients keep working.
+    """
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.page_size = self._page_size(params.get(self.page_size_query_param))
+
+        queryset = queryset.order_by('-uploaded_at', '-id')
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            uploaded_at, pk = self._decode(cursor)
+            queryset = queryset.filter(
+                Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk),
+                uploaded_at__lte=uploaded_at,
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_cursor = self._encode(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next_cursor,
+            'results': data,
+        })
+
+    def _page_size(self, value):
+        if value is None:
+            return settings.IMAGE_PAGE_SIZE
+        try:
+            size = int(value)
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer.'})
+        return max(1, min(size, settings.IMAGE_MAX_PAGE_SIZE))
+
+    def _encode(self, row):
+        uploaded_at = _row_value(row, 'uploaded_at').isoformat()
+        raw = f"{uploaded_at}|{_row_value(row, 'id')}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def _decode(self, cursor):
+        try:
+            uploaded_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(uploaded_at), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+
+def parse_sparse_fields(request):
+    """
+    Return the requested ?fields=... as a tuple, or None for the full
+    serializer output.
+    """
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = set(fields) - set(SPARSE_IMAGE_FIELDS)
+    if unknown:
+        raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+    return fields
+
+def sparse_values_queryset(queryset, fields):
+    # The cursor always needs the keyset columns.
+    columns = fields + ('id', 'uploaded_at')
+    if 'renditions' in fields:
+        columns = tuple(field for field in columns if field != 'renditions') + ('image', 'content_hash', 'renditions_key', 'user_id')
+    return queryset.values(*dict.fromkeys(columns))
+
+def sparse_image_rows(rows, fields, request):
+    """
+    Build response dicts from values() rows. The media URL prefix and the
+    rendition URLs are resolved once instead of calling
+    build_absolute_uri per image.
+    """
+    media_base = request.build_absolute_uri(settings.MEDIA_URL)
+    links = RenditionLinks(request) if 'renditions' in fields else None
+    data = []
+    for row in rows:
+        item = {field: row[field] for field in fields if field != 'renditions'}
+        if 'image' in item:
+            item['image'] = media_base + filepath_to_uri(row['image']) if row['image'] else None
+        if 'renditions' in fields:
+            image = ImageUpload(
+                id=row['id'], user_id=row['user_id'], content_hash=row['content_hash'], renditions_key=row['renditions_key']
+            )
+            item['renditions'] = rendition_map(image, request, links) if row['image'] else None
+        data.append(item)
+    return data
@@ -0,0 +1,179 @@
+# imageapp/renditions.py
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections, connection, transaction
+from django.urls import reverse
+from .encoding import EXTENSIONS, save_image
+from .models import ImageUpload
+
+# URL format -> encoder format of the 'rendition' policy
+RENDITION_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_pool = None
+_pool_lock = threading.Lock()
+_queued = set()
+
+# Signs the on-demand rendition URLs, which image tags load without auth headers.
+_signer = signing.TimestampSigner(salt='imageapp.renditions')
+
+def rendition_key(image):
+    """Names the files of one version of the image; changes on replace/revert."""
+    return image.content_hash[:16] if image.content_hash else 'original'
+
+def renditions_ready(image):
+    return image.renditions_key == rendition_key(image)
+
+def _rendition_dir(image_id):
+    return os.path.join(settings.MEDIA_ROOT, 'renditions', str(image_id))
+
+def rendition_name(image, size, fmt):
+    extension = EXTENSIONS[RENDITION_FORMATS[fmt]]
+    return f'renditions/{image.id}/{rendition_key(image)}_{size}.{extension}'
+
+# Stands in for the image id in the reversed on-demand URL.
+_PK_PLACEHOLDER = 987654321
+
+class RenditionLinks:
+    """
+    Builds rendition_map URLs for one response. The media prefix, the
+    reversed on-demand URLs and the signed token are worked out once
+    instead of per image.
+    """
+
+    def __init__(self, request):
+        self.media_base = request.build_absolute_uri(settings.MEDIA_URL)
+        self.on_demand = {
+            (size, fmt): request.build_absolute_uri(
+                reverse('image-rendition', kwargs={'pk': _PK_PLACEHOLDER, 'size': size, 'fmt': fmt})
+            ).split(str(_PK_PLACEHOLDER))
+            for size in settings.RENDITION_SIZES
+            for fmt in RENDITION_FORMATS
+        }
+        self._tokens = {}
+
+    def token(self, user_id):
+        if user_id not in self._tokens:
+            self._tokens[user_id] = rendition_token(user_id)
+        return self._tokens[user_id]
+
+    def url(self, image, size, fmt):
+        if renditions_ready(image):
+            return self.media_base + rendition_name(image, size, fmt)
+        before, after = self.on_demand[size, fmt]
+        return f'{before}{image.id}{after}?token={self.token(image.user_id)}'
+
+def rendition_map(image, request, links=None):
+    """
+    {size: {format: url}} for every configured rendition. Until the files
+    exist the URLs point at the on-demand endpoint, with a token signed
+    for the image's owner and valid for RENDITION_URL_MAX_AGE seconds.
+    Pass one RenditionLinks when mapping many images.
+    """
+    links = links or RenditionLinks(request)
+    return {
+        str(size): {fmt: links.url(image, size, fmt) for fmt in RENDITION_FORMATS}
+        for size in settings.RENDITION_SIZES
+    }
+
+def rendition_token(user_id):
+    return _signer.sign(str(user_id))
+
+def rendition_token_owner(token):
+    """The user id a rendition token was signed for, or None when invalid or expired."""
+    try:
+        value = _signer.unsign(token or '', max_age=settings.RENDITION_URL_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return int(value) if value.isdigit() else None
+
+def render_renditions(path, image):
+    """
+    Write every size and format of `image` from one decode of `path`.
+    JPEGs are decoded at the DCT scale closest to the largest rendition,
+    and each smaller size is resized from the one above it.
+    """
+    sizes = sorted(settings.RENDITION_SIZES, reverse=True)
+
+    with Image.open(path) as img:
+        ratio = min(1.0, sizes[0] / max(img.size))
+        img.draft('RGB', (int(img.width * ratio), int(img.height * ratio)))
+        current = ImageOps.exif_transpose(img).convert('RGB')
+
+    os.makedirs(_rendition_dir(image.id), exist_ok=True)
+    suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+    for size in sizes:
+        if max(current.size) > size:
+            current.thumbnail((size, size), Image.LANCZOS)
+        for fmt, encoder in RENDITION_FORMATS.items():
+            target = os.path.join(settings.MEDIA_ROOT, rendition_name(image, size, fmt))
+            save_image(current, target + suffix, 'rendition', encoder)
+            os.replace(target + suffix, target)
+
+def _remove_stale(image):
+    directory = _rendition_dir(image.id)
+    prefix = rendition_key(image) + '_'
+    for name in os.listdir(directory):
+        if not name.startswith(prefix) and not name.endswith('.tmp'):
+            os.remove(os.path.join(directory, name))
+
+def ensure_renditions(image):
+    """
+    Render the renditions of `image` unless they already exist for its
+    current content, and drop those of earlier versions. Returns False
+    when the original file is missing.
+    """
+    if renditions_ready(image):
+        return True
+    if not image.image or not os.path.exists(image.image.path):
+        return False
+
+    render_renditions(image.image.path, image)
+    _remove_stale(image)
+
+    key = rendition_key(image)
+    # Replaced meanwhile: the new version gets its own renditions.
+    ImageUpload.objects.filter(pk=image.id, content_hash=image.content_hash).update(renditions_key=key)
+    image.renditions_key = key
+    return True
+
+def delete_renditions(image_id):
+    shutil.rmtree(_rendition_dir(image_id), ignore_errors=True)
+
+def _build(image_id):
+    close_old_connections()
+    try:
+        image = ImageUpload.objects.filter(pk=image_id).first()
+        if image is not None:
+            ensure_renditions(image)
+    except Exception as e:
+        print(f"[Renditions] Image {image_id} failed: {e}")
+    finally:
+        with _pool_lock:
+            _queued.discard(image_id)
+        connection.close()
+
+def _submit(image_ids):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.RENDITION_WORKERS)
+        # An image already waiting in the pool is not queued twice.
+        image_ids = [image_id for image_id in image_ids if image_id not in _queued]
+        _queued.update(image_ids)
+    for image_id in image_ids:
+        _pool.submit(_build, image_id)
+
+def schedule_renditions(images):
+    """
+    Render renditions for `images` in a background thread pool once the
+    current transaction commits, so uploads and replaces do not wait on
+    them. Anything lost to a restart is rendered on first request or by
+    `manage.py backfill_renditions`.
+    """
+    image_ids = [image.id for image in images]
+    transaction.on_commit(lambda: _submit(image_ids))
@@ -1,18 +1,23 @@
 from rest_framework import serializers
 from .models import ImageUpload, EditedImage
+from .renditions import RenditionLinks, rendition_map
 from django.contrib.auth.models import User
 
 class ImageUploadCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ImageUpload
         exclude = ['user']
+        # Set by the server only: a client-chosen analysis_version would make
+        # the upload an analysis donor for other users' copies of the file.
+        read_only_fields = ['analysis_version', 'content_hash', 'renditions_key']
 
 class ImageUploadSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = ImageUpload
-        fields = '__all__'
+        exclude = ['renditions_key']
 
     def get_image(self, obj):
         request = self.context.get('request')
@@ -20,6 +25,15 @@ class ImageUploadSerializer(serializers.ModelSerializer):
             return None
         return request.build_absolute_uri(obj.image.url)
 
+    def get_renditions(self, obj):
+        if not obj.image:
+            return None
+        request = self.context.get('request')
+        # The context is shared by every row of a many=True serializer.
+        if 'rendition_links' not in self.context:
+            self.context['rendition_links'] = RenditionLinks(request)
+        return rendition_map(obj, request, self.context['rendition_links'])
+
 class EditedImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = EditedImage
@@ -0,0 +1,9 @@
+# imageapp/signals.py
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .face_index import forget_embeddings
+from .models import FaceEmbedding
+
+@receiver(post_delete, sender=FaceEmbedding)
+def drop_deleted_embedding(sender, instance, **kwargs):
+    forget_embeddings([instance.id])
@@ -1,3 +1,222 @@
-from django.test import TestCase
+from io import BytesIO
+from unittest import mock
+import numpy as np
+from PIL import Image, ImageEnhance
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+from .adjustments import STRIP_ROWS, sharpen
+from .batching import InferenceBatcher
+from .editing import Enhance, TRANSPOSE_METHODS, Transpose, parse_chain, parse_edit, render, slider_factor
+from .models import ImageUpload
+from .pagination import sparse_image_rows
+from .renditions import rendition_map, rendition_token_owner
+from .serializers import ImageUploadCreateSerializer
+from .views import PreviewEditChainView, etag_matches
 
-# Create your tests here.
+def noise_image(width, height, mode='RGB', seed=0):
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).convert(mode)
+
+def max_difference(a, b):
+    return int(np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).max())
+
+def random_edit(rng):
+    name = rng.choice(['rotate', 'mirror', 'grayscale', 'brightness', 'contrast', 'saturation', 'sharpness', 'crop'])
+    if name == 'rotate':
+        return f'rotate:{rng.choice([90, 180, 270, -90, 360, 30])}'
+    if name in ('mirror', 'grayscale'):
+        return name
+    if name == 'crop':
+        x, y = rng.integers(0, 4, size=2)
+        width, height = rng.integers(4, 9, size=2)
+        return f'crop:{x},{y},{width},{height}'
+    return f'{name}:{rng.choice([0, int(rng.integers(-100, 101))])}'
+
+class InferenceBatcherTests(SimpleTestCase):
+    def test_results_are_returned_in_order(self):
+        batcher = InferenceBatcher(lambda items: [item * 2 for item in items], max_batch_size=4)
+        futures = [batcher.submit(item) for item in range(10)]
+        self.assertEqual([future.result(timeout=5) for future in futures], list(range(0, 20, 2)))
+
+    def test_missing_results_fail_every_caller(self):
+        batcher = InferenceBatcher(lambda items: items[:-1], max_batch_size=4, max_wait_ms=200)
+        futures = [batcher.submit(item) for item in range(3)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+
+class FuseTests(SimpleTestCase):
+    def test_fused_chain_matches_sequential(self):
+        rng = np.random.default_rng(0)
+        img = noise_image(13, 9)
+
+        for _ in range(3000):
+            edits = [random_edit(rng) for _ in range(rng.integers(1, 8))]
+            sequential = render(img, [parse_edit(edit) for edit in edits])
+            fused = render(img, parse_chain(edits))
+
+            self.assertEqual(fused.mode, sequential.mode, edits)
+            self.assertEqual(fused.size, sequential.size, edits)
+            self.assertEqual(fused.tobytes(), sequential.tobytes(), edits)
+
+    def test_transpose_then_matches_applying_both(self):
+        img = noise_image(5, 3)
+        transposes = [Transpose(mirror, steps) for mirror in (False, True) for steps in range(4)]
+        self.assertEqual(len(TRANSPOSE_METHODS), 7)
+
+        for first in transposes:
+            for second in transposes:
+                combined = first.then(second)
+                expected = second.apply(first.apply(img))
+                self.assertEqual(combined.apply(img).tobytes(), expected.tobytes(), (first.key(), second.key()))
+
+    def test_fuse_collapses_transposes_and_tone(self):
+        ops = parse_chain(['rotate:90', 'brightness:20', 'mirror', 'contrast:-10', 'rotate:270', 'saturation:0'])
+        self.assertEqual([op.key() for op in ops], ['transpose:1:2', 'tone:brightness=1.2,contrast=0.9'])
+
+    def test_unknown_edit_is_rejected(self):
+        for edit in ('blur:3', 'rotate:abc', 'crop:1,2', ''):
+            with self.assertRaises(ValueError):
+                parse_edit(edit)
+
+class ToneTests(SimpleTestCase):
+    ENHANCERS = {'brightness': ImageEnhance.Brightness, 'contrast': ImageEnhance.Contrast}
+
+    def enhance(self, img, steps):
+        for kind, value in steps:
+            img = self.ENHANCERS[kind](img).enhance(slider_factor(value))
+        return img
+
+    def assert_matches_enhancers(self, kinds, mode, tolerance, max_steps=3, chains=200):
+        rng = np.random.default_rng(1)
+        for seed in range(chains):
+            img = noise_image(17, 11, mode, seed)
+            steps = [(str(rng.choice(kinds)), int(rng.integers(-100, 101))) for _ in range(rng.integers(1, max_steps + 1))]
+            result = render(img, parse_chain([f'{kind}:{value}' for kind, value in steps]))
+            self.assertLessEqual(max_difference(result, self.enhance(img, steps)), tolerance, steps)
+
+    def test_brightness_matches_enhancer_exactly(self):
+        self.assert_matches_enhancers(['brightness'], 'RGB', 0)
+        self.assert_matches_enhancers(['brightness'], 'L', 0)
+
+    def test_contrast_on_grayscale_matches_enhancer_exactly(self):
+        self.assert_matches_enhancers(['brightness', 'contrast'], 'L', 0)
+
+    def test_contrast_on_rgb_stays_close_to_enhancer(self):
+        # ImageEnhance rounds luminance per pixel before taking the mean.
+        self.assert_matches_enhancers(['contrast'], 'RGB', 1, max_steps=1)
+        self.assert_matches_enhancers(['brightness', 'contrast'], 'RGB', 2)
+
+class AdjustmentTests(SimpleTestCase):
+    VALUES = (-100, -60, -1, 1, 35, 100)
+
+    def test_sharpen_matches_enhancer_exactly(self):
+        # Heights around STRIP_ROWS cover partial and single-row strips.
+        sizes = [(23, STRIP_ROWS + 2), (31, 2 * STRIP_ROWS + 3), (3, 3), (2, 9), (9, 1)]
+        for mode in ('RGB', 'L'):
+            for seed, (width, height) in enumerate(sizes):
+                img = noise_image(width, height, mode, seed)
+                for value in self.VALUES:
+                    expected = ImageEnhance.Sharpness(img).enhance(slider_factor(value))
+                    self.assertEqual(sharpen(img, slider_factor(value)).tobytes(), expected.tobytes(), (mode, width, height, value))
+
+    def test_saturation_within_one_level_of_enhancer(self):
+        for seed in range(20):
+            img = noise_image(29, 19, 'RGB', seed)
+            for value in self.VALUES:
+                result = Enhance('saturation', slider_factor(value)).apply(img)
+                expected = ImageEnhance.Color(img).enhance(slider_factor(value))
+                self.assertLessEqual(max_difference(result, expected), 1, value)
+
+    def test_saturation_leaves_grayscale_unchanged(self):
+        img = noise_image(29, 19, 'L')
+        for value in self.VALUES:
+            expected = ImageEnhance.Color(img).enhance(slider_factor(value))
+            self.assertEqual(Enhance('saturation', slider_factor(value)).apply(img).tobytes(), expected.tobytes())
+
+class PreviewEditChainViewTests(SimpleTestCase):
+    def test_if_none_match_compares_whole_tags(self):
+        factory = APIRequestFactory()
+        etag = '"abc-123"'
+        for header, expected in [
+            ('"abc-123"', True),
+            ('"x", W/"abc-123"', True),
+            ('*', True),
+            ('"abc-1234"', False),
+            ('"xabc-123"', False),
+            ('', False),
+        ]:
+            request = factory.get('/api/edit/preview_chain/', HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(etag_matches(request, etag), expected, header)
+
+    def test_oversized_preview_returns_400(self):
+        request = APIRequestFactory().get(
+            '/api/edit/preview_chain/', {'image_id': 1, 'preview_size': settings.PREVIEW_MAX_SIZE + 1, 'edits': ['rotate:90']}
+        )
+        force_authenticate(request, user=User(id=1, username='owner'))
+        image = ImageUpload(id=1, user_id=1, image='uploads/photo.jpg', content_hash='0' * 64)
+
+        with mock.patch.object(ImageUpload.objects, 'get', return_value=image):
+            response = PreviewEditChainView.as_view()(request)
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_edit_returns_400(self):
+        request = APIRequestFactory().get(
+            '/api/edit/preview_chain/', {'image_id': 1, 'preview_size': 512, 'edits': ['rotate:90', 'blur:3']}
+        )
+        force_authenticate(request, user=User(id=1, username='owner'))
+        image = ImageUpload(id=1, user_id=1, image='uploads/photo.jpg', content_hash='0' * 64)
+
+        with mock.patch.object(ImageUpload.objects, 'get', return_value=image):
+            response = PreviewEditChainView.as_view()(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Unknown edit: blur:3'})
+
+class ImageUploadCreateSerializerTests(SimpleTestCase):
+    def test_server_managed_fields_are_ignored(self):
+        buffer = BytesIO()
+        noise_image(8, 8).save(buffer, format='JPEG')
+        serializer = ImageUploadCreateSerializer(data={
+            'image': SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            'analysis_version': settings.ANALYSIS_VERSION,
+            'content_hash': '0' * 64,
+            'renditions_key': '0' * 16,
+        })
+
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        for field in ('analysis_version', 'content_hash', 'renditions_key'):
+            self.assertNotIn(field, serializer.validated_data)
+
+class RenditionMapTests(SimpleTestCase):
+    def test_sparse_rows_resolve_urls_once(self):
+        request = APIRequestFactory().get('/api/images/')
+        rows = [
+            {'id': pk, 'user_id': 7, 'image': f'uploads/{pk}.jpg', 'content_hash': f'{pk:064x}', 'renditions_key': ''}
+            for pk in range(1, 51)
+        ]
+
+        with mock.patch('imageapp.renditions.rendition_token', wraps=lambda user_id: f'token-{user_id}') as token:
+            data = sparse_image_rows(rows, ('id', 'renditions'), request)
+
+        self.assertEqual(token.call_count, 1)
+        size = str(settings.RENDITION_SIZES[0])
+        self.assertEqual(data[41]['renditions'][size]['webp'], f'http://testserver/api/images/42/renditions/{size}.webp?token=token-7')
+
+    def test_token_names_the_owner(self):
+        request = APIRequestFactory().get('/api/images/')
+        image = ImageUpload(id=3, user_id=12, image='uploads/3.jpg', content_hash='a' * 64)
+        url = rendition_map(image, request)[str(settings.RENDITION_SIZES[0])]['jpeg']
+
+        self.assertEqual(rendition_token_owner(url.split('token=')[1]), 12)
+        self.assertIsNone(rendition_token_owner('12:forged'))
+
+    def test_ready_renditions_point_at_media(self):
+        request = APIRequestFactory().get('/api/images/')
+        image = ImageUpload(id=3, user_id=12, image='uploads/3.jpg', content_hash='a' * 64, renditions_key='a' * 16)
+        url = rendition_map(image, request)['256']['webp']
+        self.assertEqual(url, f'http://testserver{settings.MEDIA_URL}renditions/3/{"a" * 16}_256.webp')
@@ -10,10 +10,12 @@ from .views import ImageSearchView
 from .views import ReplaceImageView
 from .views import SaveAsCopyView
 from .views import RevertImageView
+from .views import ImageRenditionView
 from .views import RecycleBinListView
 from .views import RestoreImageView
 from .views import PermanentDeleteImageView
 from .views import FaceGroupView
+from .views import FaceSpriteView
 from .views import CreateStickerView
 from .views import RegisterView
 from .views import AdjustImageView
@@ -21,10 +23,15 @@ from .views import PreviewStickerView
 from .views import UserListView
 from .views import FaceClusteringView
 from .views import ColorizeImageView
+from .views import AnalysisStatusView
+from .views import BulkImageUploadView
+from .views import LabelFacetView
+from .views import SimilarFacesView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 urlpatterns = [
     path('upload/', ImageUploadView.as_view(), name='image-upload'),
+    path('upload/bulk/', BulkImageUploadView.as_view(), name='image-upload-bulk'),
     path('images/', ImageListView.as_view(), name='image-list'),
     path('edit/crop/', CropImageView.as_view(), name='image-crop'),
     path('images/<int:pk>/', ImageDetailView.as_view(), name='image-detail'),
@@ -32,14 +39,17 @@ urlpatterns = [
     path('edit/mirror/', MirrorImageView.as_view(), name='image-mirror'),
     path('edit/grayscale/', GrayscaleImageView.as_view(), name='image-grayscale'),
     path('search/', ImageSearchView.as_view(), name='image-search'),
+    path('search/facets/', LabelFacetView.as_view(), name='label-facets'),
     path('images/<int:pk>/', ImageDetailView.as_view(), name='image-detail'),
     path('images/<int:pk>/replace/', ReplaceImageView.as_view(), name='replace-image'),
     path('images/copy/', SaveAsCopyView.as_view(), name='save-as-copy'),
     path('images/<int:pk>/revert/', RevertImageView.as_view(), name='revert-image'),
+    path('images/<int:pk>/renditions/<int:size>.<str:fmt>', ImageRenditionView.as_view(), name='image-rendition'),
     path('recycle/', RecycleBinListView.as_view(), name='recycle-bin'),
     path('images/<int:pk>/restore/', RestoreImageView.as_view()),
     path('images/<int:pk>/permanent-delete/', PermanentDeleteImageView.as_view()),
     path('faces/group/', FaceGroupView.as_view(), name='face-group'),
+    path('faces/sprite/', FaceSpriteView.as_view(), name='face-sprite'),
     path('edit/create_sticker/', CreateStickerView.as_view(), name='create-sticker'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -50,5 +60,7 @@ urlpatterns = [
     path('users/', UserListView.as_view(), name='user-list'),
     path('faces/cluster/', FaceClusteringView.as_view(), name='face-cluster'),
     path('faces/cluster/<int:pk>/rename/', RenameFaceClusterView.as_view()),
+    path('faces/similar/', SimilarFacesView.as_view(), name='face-similar'),
     path('edit/colorize/', ColorizeImageView.as_view(), name='colorize-image'),
+    path('images/<int:pk>/analysis/', AnalysisStatusView.as_view(), name='analysis-status'),
 ]
\ No newline at end of file
@@ -1,4 +1,5 @@
 # imageapp/utils.py
+import hashlib
 import os
 from .models import EditedImage
 
@@ -13,4 +14,18 @@ def resolve_image_path(request, original):
         .order_by('-edited_at')
         .first()
     )
-    return last.edited.path if last else original.image.path
\ No newline at end of file
+    return last.edited.path if last else original.image.path
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def uploaded_file_sha256(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
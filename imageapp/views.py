@@ -1,49 +1,50 @@
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.generics import ListAPIView
+from rest_framework.generics import ListAPIView, GenericAPIView
 from rest_framework import status
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import RetrieveDestroyAPIView
 from rest_framework.permissions import IsAuthenticated
 from PIL import Image
-from PIL import ImageOps
-from PIL import ImageEnhance
 from io import BytesIO
 from django.core.files.base import ContentFile
 from django.core.files import File
 from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.utils.http import parse_etags
 from .models import EditedImage, ImageUpload, ImageRestorePoint
 from .serializers import EditedImageSerializer
 from .serializers import ImageUploadCreateSerializer
 from .serializers import ImageUploadSerializer
 from .serializers import RegisterSerializer
-from ultralytics import YOLO
-from .utils import resolve_image_path
-from rembg import remove
+from .utils import resolve_image_path, file_sha256, uploaded_file_sha256
+from .ml import remove_background
 from .views import resolve_image_path
+import hashlib
 import os
 import shutil
-import face_recognition
 from django.contrib.auth.models import User
 from rest_framework.permissions import IsAdminUser
 import numpy as np
-from .models import FaceEmbedding, FaceMatch, FaceCluster
+from .models import FaceEmbedding, FaceMatch, FaceCluster, AnalysisJob
+from .jobs import enqueue_analysis, enqueue_analysis_batch, run_jobs
+from .editing import chain_digest, forget_image, parse_chain, render_file, render_preview
+from .encoding import CONTENT_TYPES, EXTENSIONS, encode_image, negotiate_format, save_image
+from .embeddings import unpack_encoding
+from .clustering import add_image_to_clusters, cluster_user_faces, delete_empty_clusters, remove_image_from_clusters
+from .face_index import find_similar_faces
+from .face_groups import bump_face_groups, get_face_groups
+from .face_sprites import build_face_sprite
+from .face_thumbnails import delete_face_thumbnails, face_thumbnail_url
+from .renditions import RENDITION_FORMATS, delete_renditions, rendition_name, rendition_token_owner, renditions_ready, schedule_renditions
+from .labels import label_facets, search_image_ids, set_labels_deleted
+from .pagination import KeysetPagination, parse_sparse_fields, sparse_image_rows, sparse_values_queryset
 from . import models
 from django.db.models import Count
 import requests
 
-model = YOLO('yolov8n.pt') 
-
-def detect_objects(image_path):
-    results = model.predict(source=image_path, save=False, conf=0.5)
-    labels = set()
-
-    for result in results:
-        for box in result.boxes:
-            class_id = int(box.cls[0])
-            labels.add(result.names[class_id])
-
-    return list(labels)
-
 class ImageUploadView(APIView):
     permission_classes = [IsAuthenticated]
     def post(self, request, *args, **kwargs):
@@ -53,56 +54,169 @@ class ImageUploadView(APIView):
 
         if upload_serializer.is_valid():
             instance = upload_serializer.save(user=request.user)
-            detected_labels = detect_objects(instance.image.path)
-            instance.labels = detected_labels
-            instance.save()
-            
-            try:
-                img_path = instance.image.path
-                img = face_recognition.load_image_file(img_path)
-                face_locations = face_recognition.face_locations(img)
-                face_encodings = face_recognition.face_encodings(img, face_locations)
-
-                for encoding in face_encodings:
-                    FaceEmbedding.objects.create(
-                        image=instance,
-                        encoding=encoding.tolist(),
-                        clustered=False
-                    )
-            except Exception as e:
-                print(f"[FaceEmbedding] Failed for Image {instance.id}: {e}")
-            
+            instance.content_hash = file_sha256(instance.image.path)
+            instance.save(update_fields=['content_hash'])
+            job = enqueue_analysis(instance)
+            schedule_renditions([instance])
 
-            print(f"Detected labels: {detected_labels}")
             response_serializer = ImageUploadSerializer(instance, context={'request': request})
-            return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+            data = dict(response_serializer.data, analysis_job=job.id)
+            return Response(data, status=status.HTTP_201_CREATED)
 
         print("Serializer errors:", upload_serializer.errors)
         return Response(upload_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class ImageListView(ListAPIView):
+class BulkImageUploadView(APIView):
+    """
+    Upload many files in one multipart request (field `images`). Rows and
+    analysis jobs are written with bulk inserts in one transaction. With
+    `?sync=true` the batch is analysed before responding; otherwise the
+    background workers pick it up.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        files = request.FILES.getlist('images')
+        if not files:
+            return Response({'error': 'No images provided'}, status=400)
+        if len(files) > settings.BULK_UPLOAD_MAX_FILES:
+            return Response({'error': f'At most {settings.BULK_UPLOAD_MAX_FILES} images per request'}, status=400)
+
+        sync = request.query_params.get('sync') == 'true'
+        image_field = serializers.ImageField()
+        results = []
+        images = []
+
+        try:
+            for upload in files:
+                try:
+                    image_field.run_validation(upload)
+                except ValidationError as e:
+                    results.append({'filename': upload.name, 'errors': e.detail})
+                    continue
+
+                image = ImageUpload(user=request.user, content_hash=uploaded_file_sha256(upload))
+                image.image.save(upload.name, upload, save=False)
+                images.append(image)
+                results.append({'filename': upload.name, 'image': image})
+
+            if not images:
+                return Response({'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+            with transaction.atomic():
+                ImageUpload.objects.bulk_create(images)
+                jobs = enqueue_analysis_batch(images, claim=sync)
+                schedule_renditions(images)
+        except Exception:
+            # No row points at these files.
+            for image in images:
+                image.image.delete(save=False)
+            raise
+
+        if sync:
+            run_jobs(jobs)
+
+        jobs_by_image = {job.image_id: job for job in jobs}
+        response = []
+        for result in results:
+            image = result.pop('image', None)
+            if image is not None:
+                job = jobs_by_image[image.id]
+                result.update(ImageUploadSerializer(image, context={'request': request}).data)
+                result['analysis_job'] = job.id
+                result['analysis_status'] = job.status
+            response.append(result)
+
+        return Response({'results': response}, status=status.HTTP_201_CREATED)
+
+class AnalysisStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            image = ImageUpload.objects.get(pk=pk, user=request.user)
+        except ImageUpload.DoesNotExist:
+            return Response({'error': 'Image not found'}, status=404)
+
+        job = AnalysisJob.objects.filter(image=image).order_by('-created_at').first()
+        if job is None:
+            return Response({'image_id': image.id, 'status': None, 'labels': image.labels})
+
+        return Response({
+            'image_id': image.id,
+            'job_id': job.id,
+            'status': job.status,
+            'attempts': job.attempts,
+            'error': job.error,
+            'timings': job.timings,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+            'labels': image.labels,
+            'faces': image.face_embeddings.count(),
+        })
+
+class ImageListMixin:
+    """
+    Shared list behaviour: opt-in keyset pagination and a sparse
+    `?fields=` mode that serializes straight from values().
+    """
+    pagination_class = KeysetPagination
+
+    def list_images(self, request, queryset):
+        fields = parse_sparse_fields(request)
+        if fields:
+            queryset = sparse_values_queryset(queryset, fields)
+
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+
+        if fields:
+            data = sparse_image_rows(rows, fields, request)
+        else:
+            data = ImageUploadSerializer(rows, many=True, context={'request': request}).data
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.list_images(request, self.get_queryset())
+
+class ImageListView(ImageListMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ImageUploadSerializer
 
     def get_queryset(self):
         deleted = self.request.query_params.get('deleted')
         if deleted == 'true':
-            return ImageUpload.objects.filter(user=self.request.user, is_deleted=True).order_by('-uploaded_at')
-        return ImageUpload.objects.filter(user=self.request.user, is_deleted=False).order_by('-uploaded_at')
+            return ImageUpload.objects.filter(user=self.request.user, is_deleted=True).order_by('-uploaded_at', '-id')
+        return ImageUpload.objects.filter(user=self.request.user, is_deleted=False).order_by('-uploaded_at', '-id')
 
     def get_serializer_context(self):
         return {'request': self.request}
 
 class ImageDetailView(RetrieveDestroyAPIView):
-    queryset = ImageUpload.objects.all()
+    permission_classes = [IsAuthenticated]
     serializer_class = ImageUploadSerializer
 
+    def get_queryset(self):
+        return ImageUpload.objects.filter(user=self.request.user)
+
     def get_serializer_context(self):
         return {'request': self.request}
 
     def perform_destroy(self, instance):
+        # Only the request that actually bins the image takes its faces
+        # out of the centroids; a repeated DELETE changes nothing. The user
+        # row lock is the one clustering holds, so a running clustering
+        # never counts the image as live after this.
+        with transaction.atomic():
+            User.objects.select_for_update().get(pk=instance.user_id)
+            if ImageUpload.objects.filter(pk=instance.pk, is_deleted=False).update(is_deleted=True):
+                set_labels_deleted(instance, True)
+                remove_image_from_clusters(instance)
         instance.is_deleted = True
-        instance.save()
 
         edits = EditedImage.objects.filter(original=instance)
         for edit in edits:
@@ -124,18 +238,9 @@ class CropImageView(APIView):
             last_edit = EditedImage.objects.filter(original=original).order_by('-edited_at').first()
             image_path = last_edit.edited.path if last_edit else original.image.path
 
-            img = Image.open(image_path)
-            cropped = img.crop((x, y, x + width, y + height))
-
-            buffer = BytesIO()
-            cropped.save(buffer, format='JPEG')
-            cropped_file = ContentFile(buffer.getvalue())
-
-            edited_instance = EditedImage.objects.create(
-                original=original,
+            edited_instance = save_rendered_edit(
+                original, image_path, [f'crop:{x},{y},{width},{height}'], f"cropped_{original.id}.jpg"
             )
-            edited_instance.edited.save(f"cropped_{original.id}.jpg", cropped_file)
-            edited_instance.save()
 
             serializer = EditedImageSerializer(edited_instance)
             return Response(serializer.data, status=201)
@@ -143,6 +248,13 @@ class CropImageView(APIView):
         except ImageUpload.DoesNotExist:
             return Response({"error": "Image not found"}, status=404)
         
+def save_rendered_edit(original, source_path, edits, filename):
+    """Run `edits` on `source_path` and store the result as a temporary edit."""
+    content = ContentFile(render_file(source_path, edits))
+    edited = EditedImage.objects.create(original=original, temporary=True)
+    edited.edited.save(filename, content)
+    return edited
+
 def resolve_image_path(request, original):
     
     input_path = request.data.get('input_path')
@@ -155,9 +267,44 @@ def resolve_image_path(request, original):
 
     return original.image.path
 
+def parse_preview_size(value):
+    """Long edge of a proxy preview; at least 64, ValueError above PREVIEW_MAX_SIZE."""
+    size = int(value)
+    if size > settings.PREVIEW_MAX_SIZE:
+        raise ValueError(f'preview_size must be at most {settings.PREVIEW_MAX_SIZE}')
+    return max(64, size)
+
+def etag_matches(request, etag):
+    """If-None-Match check: weak comparison against each listed tag, or `*`."""
+    tags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return '*' in tags or etag in (tag.removeprefix('W/') for tag in tags)
+
 def resolve_original_image_path(original):
     return original.image.path
 
+def resolve_full_resolution_path(request, original):
+    """
+    Like resolve_image_path, but a proxy-sized preview is replaced by a
+    full-resolution render of its edit chain from the original. Inline
+    previews are never stored, so their chain comes as `edits` in the
+    request. Raises ValueError for an invalid chain.
+    """
+    if not request.data.get('input_path'):
+        edits = request.data.get('edits')
+        if edits is None:
+            last_edit = EditedImage.objects.filter(original=original, temporary=True).order_by('-edited_at').first()
+            if last_edit and last_edit.preview_size and last_edit.edits is not None:
+                edits = last_edit.edits
+
+        if edits is not None:
+            path = os.path.join(settings.MEDIA_ROOT, 'edited', f'full_chain_{original.id}.jpg')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(render_file(resolve_original_image_path(original), edits))
+            return path
+
+    return resolve_image_path(request, original)
+
 class RotateImageView(APIView):
     def post(self, request):
         image_id = request.data.get('image_id')
@@ -167,19 +314,7 @@ class RotateImageView(APIView):
             original = ImageUpload.objects.get(id=image_id)
             
             image_path = resolve_image_path(request, original)
-            img = Image.open(image_path)
-            rotated = img.rotate(-degrees, expand=True)
-
-            buffer = BytesIO()
-            rotated.save(buffer, format='JPEG')
-            image_content = ContentFile(buffer.getvalue())
-
-            filename = f'rotated_{image_id}.jpg'
-            edited_instance = EditedImage.objects.create(
-                original=original, temporary=True
-            )
-            edited_instance.edited.save(filename, image_content)
-            edited_instance.save()
+            edited_instance = save_rendered_edit(original, image_path, [f'rotate:{degrees}'], f'rotated_{image_id}.jpg')
 
             serializer = EditedImageSerializer(edited_instance, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -195,19 +330,7 @@ class MirrorImageView(APIView):
             original = ImageUpload.objects.get(id=image_id)
             
             image_path = resolve_image_path(request, original)
-            img = Image.open(image_path)
-
-            img = ImageOps.exif_transpose(img)
-            mirrored = ImageOps.mirror(img)
-
-            buffer = BytesIO()
-            mirrored.save(buffer, format='JPEG')
-            image_content = ContentFile(buffer.getvalue())
-
-            filename = f'mirrored_{image_id}.jpg'
-            edited_instance = EditedImage.objects.create(original=original, temporary=True)
-            edited_instance.edited.save(filename, image_content)
-            edited_instance.save()
+            edited_instance = save_rendered_edit(original, image_path, ['mirror'], f'mirrored_{image_id}.jpg')
 
             serializer = EditedImageSerializer(edited_instance, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -223,19 +346,7 @@ class GrayscaleImageView(APIView):
             original = ImageUpload.objects.get(id=image_id)
             
             image_path = resolve_image_path(request, original)
-            img = Image.open(image_path)
-
-            img = ImageOps.exif_transpose(img) 
-            gray = ImageOps.grayscale(img)
-
-            buffer = BytesIO()
-            gray.save(buffer, format='JPEG')
-            image_content = ContentFile(buffer.getvalue())
-
-            filename = f'grayscale_{image_id}.jpg'
-            edited_instance = EditedImage.objects.create(original=original, temporary=True)
-            edited_instance.edited.save(filename, image_content)
-            edited_instance.save()
+            edited_instance = save_rendered_edit(original, image_path, ['grayscale'], f'grayscale_{image_id}.jpg')
 
             serializer = EditedImageSerializer(edited_instance, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -243,21 +354,37 @@ class GrayscaleImageView(APIView):
         except ImageUpload.DoesNotExist:
             return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
 
-class ImageSearchView(APIView):
+class ImageSearchView(ImageListMixin, GenericAPIView):
+    """
+    Search by detected labels. `q` holds one or more comma separated
+    labels; `match` is `prefix` (default) or `exact`; `op` is `and`
+    (default) or `or`. Supports the same `cursor`/`page_size`/`fields`
+    parameters as the image list.
+    """
     permission_classes = [IsAuthenticated]
     def get(self, request):
         query = request.query_params.get('q')
-        if query:
+        terms = [term for term in (query or '').split(',') if term.strip()]
+        if terms:
+            match = request.query_params.get('match', 'prefix')
+            op = request.query_params.get('op', 'and')
+            if match not in ('prefix', 'exact') or op not in ('and', 'or'):
+                return Response({"error": "Invalid match or op."}, status=status.HTTP_400_BAD_REQUEST)
+
             images = ImageUpload.objects.filter(
-                user=request.user,
-                is_deleted=False,
-                labels__icontains=query
-            )
-            serializer = ImageUploadSerializer(images, many=True, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_200_OK)
+                id__in=search_image_ids(request.user, terms, match=match, op=op)
+            ).order_by('-uploaded_at', '-id')
+            return self.list_images(request, images)
         else:
             return Response({"error": "No search query provided."}, status=status.HTTP_400_BAD_REQUEST)
 
+class LabelFacetView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        facets = label_facets(request.user, prefix=request.query_params.get('prefix'))
+        return Response({'facets': [{'label': f['name'], 'count': f['count']} for f in facets]})
+
 class ReplaceImageView(APIView):
     def post(self, request, pk):
         try:
@@ -265,7 +392,10 @@ class ReplaceImageView(APIView):
         except ImageUpload.DoesNotExist:
             return Response({'error': 'Original image not found'}, status=404)
 
-        new_path = resolve_image_path(request, image)
+        try:
+            new_path = resolve_full_resolution_path(request, image)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
 
         if not ImageRestorePoint.objects.filter(original=image).exists():
             backup_path = image.image.path
@@ -274,6 +404,7 @@ class ReplaceImageView(APIView):
                 restore.backup.save(f"restore_{os.path.basename(backup_path)}", File(f))
                 restore.save()
 
+        forget_image(image.image.path)
         if os.path.exists(image.image.path):
             os.remove(image.image.path)
 
@@ -290,11 +421,14 @@ class ReplaceImageView(APIView):
         shutil.copyfile(new_path, final_path)
 
         image.image.name = f'uploads/{final_name}'
+        image.content_hash = file_sha256(final_path)
+        image.analysis_version = ''
         image.save()
+        schedule_renditions([image])
 
         EditedImage.objects.filter(original=image).update(temporary=False)
 
-        if "preview_chain_" in original_name and os.path.exists(new_path):
+        if ("preview_chain_" in original_name or "full_chain_" in original_name) and os.path.exists(new_path):
             os.remove(new_path)
 
         return Response({'message': 'Image replaced successfully'})
@@ -312,32 +446,26 @@ class SaveAsCopyView(APIView):
         except ImageUpload.DoesNotExist:
             return Response({'error': 'Original image not found'}, status=404)
 
-        source_path = resolve_image_path(request, original)
+        try:
+            source_path = resolve_full_resolution_path(request, original)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         filename = os.path.basename(source_path)
         copy_name = f"copy_{filename}"
 
         with open(source_path, 'rb') as f:
-            new_image = ImageUpload(user=request.user)
+            new_image = ImageUpload(user=request.user, content_hash=file_sha256(source_path))
             new_image.image.save(copy_name, File(f))
             new_image.save()
 
-        try:
-            img_path = new_image.image.path
-            img = face_recognition.load_image_file(img_path)
-            face_locations = face_recognition.face_locations(img)
-            face_encodings = face_recognition.face_encodings(img, face_locations)
-
-            for encoding in face_encodings:
-                FaceEmbedding.objects.create(
-                    image=new_image,
-                    encoding=encoding.tolist(),
-                    clustered=False
-                )
-        except Exception as e:
-            print(f"[FaceEmbedding] Failed for copied Image {new_image.id}: {e}")
+        if filename.startswith("full_chain_"):
+            os.remove(source_path)
+
+        job = enqueue_analysis(new_image)
+        schedule_renditions([new_image])
 
         serializer = ImageUploadSerializer(new_image, context={'request': request})
-        return Response(serializer.data, status=201)
+        return Response(dict(serializer.data, analysis_job=job.id), status=201)
 
 
 class RevertImageView(APIView):
@@ -349,6 +477,7 @@ class RevertImageView(APIView):
                 restore = ImageRestorePoint.objects.get(original=image)
                 backup_path = restore.backup.path
 
+                forget_image(image.image.path)
                 if os.path.exists(image.image.path):
                     os.remove(image.image.path)
 
@@ -357,7 +486,10 @@ class RevertImageView(APIView):
                 shutil.copyfile(backup_path, restored_path)
 
                 image.image.name = f'uploads/{new_name}'
+                image.content_hash = file_sha256(restored_path)
+                image.analysis_version = ''
                 image.save()
+                schedule_renditions([image])
 
             except ImageRestorePoint.DoesNotExist:
                 return Response({'error': 'No restore point available.'}, status=404)
@@ -373,19 +505,56 @@ class RevertImageView(APIView):
         except ImageUpload.DoesNotExist:
             return Response({'error': 'Image not found'}, status=404)
 
-class RecycleBinListView(ListAPIView):
+class ImageRenditionView(APIView):
+    """
+    Target of rendition URLs of an image that has none yet (uploaded
+    before renditions existed, or still queued). The URL carries a signed
+    `token` from rendition_map, signed for the image's owner. Redirects to the rendition once it exists;
+    until then the renditions are queued on the background pool and the
+    original is served instead.
+    """
+    def get(self, request, pk, size, fmt):
+        if size not in settings.RENDITION_SIZES or fmt not in RENDITION_FORMATS:
+            return Response({'error': 'Unknown rendition'}, status=404)
+        owner = rendition_token_owner(request.query_params.get('token'))
+        if owner is None:
+            return Response({'error': 'Invalid or expired rendition link'}, status=403)
+
+        try:
+            image = ImageUpload.objects.get(pk=pk, user_id=owner)
+        except ImageUpload.DoesNotExist:
+            return Response({'error': 'Image not found'}, status=404)
+
+        if renditions_ready(image):
+            return HttpResponseRedirect(settings.MEDIA_URL + rendition_name(image, size, fmt))
+        if not image.image or not os.path.exists(image.image.path):
+            return Response({'error': 'Image file missing'}, status=404)
+
+        schedule_renditions([image])
+        response = HttpResponseRedirect(image.image.url)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+class RecycleBinListView(ImageListMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ImageUploadSerializer
 
     def get_queryset(self):
-        return ImageUpload.objects.filter(user=self.request.user, is_deleted=True).order_by('-uploaded_at')
+        return ImageUpload.objects.filter(user=self.request.user, is_deleted=True).order_by('-uploaded_at', '-id')
 
 class RestoreImageView(APIView):
+    permission_classes = [IsAuthenticated]
+
     def post(self, request, pk):
         try:
-            image = ImageUpload.objects.get(pk=pk)
-            image.is_deleted = False
-            image.save()
+            image = ImageUpload.objects.get(pk=pk, user=request.user)
+            with transaction.atomic():
+                # As in ImageDetailView.perform_destroy: only a real restore
+                # touches the centroids, under the clustering lock.
+                User.objects.select_for_update().get(pk=image.user_id)
+                if ImageUpload.objects.filter(pk=image.pk, is_deleted=True).update(is_deleted=False):
+                    set_labels_deleted(image, False)
+                    add_image_to_clusters(image)
             return Response({'message': 'Image restored.'}, status=200)
         except ImageUpload.DoesNotExist:
             return Response({'error': 'Not found'}, status=404)
@@ -396,47 +565,63 @@ class PermanentDeleteImageView(APIView):
     def delete(self, request, pk):
         try:
             image = ImageUpload.objects.get(pk=pk, user=request.user, is_deleted=True)
+        except ImageUpload.DoesNotExist:
+            return Response({'error': 'Image not found or not deleted yet.'}, status=404)
 
-            thumbnail_path = os.path.join(settings.MEDIA_ROOT, 'uploads', f'face_{image.id}.jpg')
-            if os.path.exists(thumbnail_path):
-                os.remove(thumbnail_path)
+        image_path = image.image.path if image.image else None
 
+        with transaction.atomic():
+            # The faces already left their cluster centroids when the image was binned.
+            cluster_ids = list(FaceMatch.objects.filter(image=image).values_list('cluster_id', flat=True))
+            embedding_ids = list(FaceEmbedding.objects.filter(image=image).values_list('id', flat=True))
             FaceEmbedding.objects.filter(image=image).delete()
             FaceMatch.objects.filter(image=image).delete()
+            delete_empty_clusters(cluster_ids)
+            bump_face_groups(request.user.id)
+            image.delete()
 
-            if image.image and os.path.exists(image.image.path):
-                os.remove(image.image.path)
+            def remove_files():
+                thumbnail_path = os.path.join(settings.MEDIA_ROOT, 'uploads', f'face_{pk}.jpg')
+                if os.path.exists(thumbnail_path):
+                    os.remove(thumbnail_path)
+                delete_face_thumbnails(embedding_ids)
+                if image_path and os.path.exists(image_path):
+                    forget_image(image_path)
+                    os.remove(image_path)
+                delete_renditions(pk)
 
-            image.delete()
-            return Response(status=204)
+            # Files only go once the rows are gone for good.
+            transaction.on_commit(remove_files)
 
-        except ImageUpload.DoesNotExist:
-            return Response({'error': 'Image not found or not deleted yet.'}, status=404)
+        return Response(status=204)
 
 class FaceGroupView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
         groups = []
+        for group in get_face_groups(request.user.id):
+            thumbnail_id = group['thumbnail_id']
+            groups.append({
+                'id': group['id'],
+                'image_ids': group['image_ids'],
+                'name': group['name'],
+                'thumbnail': request.build_absolute_uri(face_thumbnail_url(thumbnail_id)) if thumbnail_id else None
+            })
 
-        clusters = FaceCluster.objects.filter(facematch__image__user=user).distinct()
-
-        for cluster in clusters:
-            image_ids = FaceMatch.objects.filter(
-                cluster=cluster,
-                image__user=user,
-                image__is_deleted=False
-            ).values_list('image_id', flat=True)
+        return Response({'groups': groups})
 
-            if image_ids:
-                groups.append({
-                    'id': cluster.id,
-                    'image_ids': list(image_ids),
-                    'name': cluster.name or 'Unknown'
-                })
+class FaceSpriteView(APIView):
+    """
+    All People thumbnails of the user packed into one sprite sheet, with
+    the offset of every cluster's cell, so the client loads one image.
+    """
+    permission_classes = [IsAuthenticated]
 
-        return Response({'groups': groups})
+    def get(self, request):
+        sprite = build_face_sprite(request.user.id)
+        sprite['sprite'] = request.build_absolute_uri(sprite['sprite'])
+        return Response(sprite)
 
 class CreateStickerView(APIView):
     permission_classes = [IsAuthenticated]
@@ -449,14 +634,12 @@ class CreateStickerView(APIView):
             with open(img_path, 'rb') as f:
                 input_image = f.read()
 
-            output_image = remove(input_image)
+            output_image = remove_background(input_image)
 
             img_bytes = BytesIO(output_image)
             pil_image = Image.open(img_bytes).convert("RGBA")
 
-            buffer = BytesIO()
-            pil_image.save(buffer, format="PNG")
-            content_file = ContentFile(buffer.getvalue())
+            content_file = ContentFile(encode_image(pil_image, 'sticker'))
 
             copy = ImageUpload(user=request.user)
             filename = f"sticker_{original.id}.png"
@@ -487,35 +670,20 @@ class AdjustImageView(APIView):
             image_id = request.data.get("image_id")
             original = ImageUpload.objects.get(id=image_id)
 
-            image_path = original.image.path
-
-            img = Image.open(image_path).convert("RGB")
-
-            def apply_slider(enhancer_class, value, image):
-                if value is None:
-                    return image
-                scale = (value + 100) / 100
-                enhancer = enhancer_class(image)
-                return enhancer.enhance(scale)
-
-            img = apply_slider(ImageEnhance.Brightness, request.data.get("brightness"), img)
-            img = apply_slider(ImageEnhance.Contrast, request.data.get("contrast"), img)
-            img = apply_slider(ImageEnhance.Color, request.data.get("saturation"), img)
-            img = apply_slider(ImageEnhance.Sharpness, request.data.get("sharpness"), img)
-            
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG")
-            content_file = ContentFile(buffer.getvalue())
-
-            edited = EditedImage.objects.create(original=original, temporary=True)
-            edited.edited.save(f"adjusted_{original.id}.jpg", content_file)
-            edited.save()
+            edits = [
+                f"{slider}:{request.data[slider]}"
+                for slider in ("brightness", "contrast", "saturation", "sharpness")
+                if request.data.get(slider) is not None
+            ]
+            edited = save_rendered_edit(original, original.image.path, edits, f"adjusted_{original.id}.jpg")
 
             serializer = EditedImageSerializer(edited, context={'request': request})
             return Response(serializer.data, status=201)
 
         except ImageUpload.DoesNotExist:
             return Response({'error': 'Image not found'}, status=404)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -531,7 +699,7 @@ class PreviewStickerView(APIView):
             with open(img_path, 'rb') as f:
                 input_image = f.read()
 
-            output_image = remove(input_image)
+            output_image = remove_background(input_image)
 
             img_bytes = BytesIO(output_image)
             pil_image = Image.open(img_bytes).convert("RGBA")
@@ -539,7 +707,7 @@ class PreviewStickerView(APIView):
             filename = f"preview_sticker_{original.id}.png"
             temp_path = os.path.join(settings.MEDIA_ROOT, 'previews', filename)
             os.makedirs(os.path.dirname(temp_path), exist_ok=True)
-            pil_image.save(temp_path, format="PNG")
+            save_image(pil_image, temp_path, 'sticker_preview')
 
             sticker_url = request.build_absolute_uri(os.path.join(settings.MEDIA_URL, 'previews', filename))
             return Response({'sticker_url': sticker_url}, status=200)
@@ -552,70 +720,85 @@ class PreviewStickerView(APIView):
 class PreviewEditChainView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        from PIL import ImageEnhance
+    def perform_content_negotiation(self, request, force=False):
+        # GET answers with image bytes; its Accept header may list image types only.
+        return super().perform_content_negotiation(request, force=True)
 
-        image_id = request.data.get('image_id')
-        edits = request.data.get('edits', [])
+    def get(self, request):
+        """
+        Inline preview for slider drags: `?image_id=&preview_size=&edits=...`
+        (one `edits` per step) answered with the encoded image itself.
+        Nothing is written to disk or the database until the user saves,
+        which sends the chain along. The ETag covers the image version,
+        preview size, format and fused chain, so a repeated request gets a
+        304 without rendering.
+        """
+        edits = request.query_params.getlist('edits')
+        preview_size = request.query_params.get('preview_size')
+        if not preview_size:
+            return Response({'error': 'preview_size is required'}, status=400)
 
         try:
-            original = ImageUpload.objects.get(id=image_id, user=request.user)
-            image_path = resolve_image_path(request, original)
-            img = Image.open(resolve_original_image_path(original)).convert("RGB")
-
-            for edit in edits:
-                if edit.startswith('rotate:'):
-                    degrees = int(edit.split(':')[1])
-                    img = img.rotate(-degrees, expand=True)
+            original = ImageUpload.objects.get(id=request.query_params.get('image_id'), user=request.user)
+            preview_size = parse_preview_size(preview_size)
+            fmt = negotiate_format(request, 'preview')
+            version = f'{original.id}:{original.image.name}:{original.content_hash}:{preview_size}:{fmt}'
+            etag = f'"{chain_digest(parse_chain(edits))}-{hashlib.sha1(version.encode()).hexdigest()[:16]}"'
+
+            if etag_matches(request, etag):
+                response = HttpResponseNotModified()
+            else:
+                content = render_preview(resolve_original_image_path(original), edits, preview_size, fmt)
+                response = HttpResponse(content, content_type=CONTENT_TYPES[fmt])
+
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            response['Vary'] = 'Accept, Authorization'
+            return response
 
-                elif edit == 'mirror':
-                    img = ImageOps.mirror(ImageOps.exif_transpose(img))
-
-                elif edit == 'grayscale':
-                    img = ImageOps.grayscale(img).convert("RGB")
-
-                elif edit.startswith('brightness:'):
-                    value = int(edit.split(':')[1])
-                    enhancer = ImageEnhance.Brightness(img)
-                    img = enhancer.enhance((value + 100) / 100)
-
-                elif edit.startswith('contrast:'):
-                    value = int(edit.split(':')[1])
-                    enhancer = ImageEnhance.Contrast(img)
-                    img = enhancer.enhance((value + 100) / 100)
-
-                elif edit.startswith('saturation:'):
-                    value = int(edit.split(':')[1])
-                    enhancer = ImageEnhance.Color(img)
-                    img = enhancer.enhance((value + 100) / 100)
+        except ImageUpload.DoesNotExist:
+            return Response({'error': 'Image not found'}, status=404)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
 
-                elif edit.startswith('sharpness:'):
-                    value = int(edit.split(':')[1])
-                    enhancer = ImageEnhance.Sharpness(img)
-                    img = enhancer.enhance((value + 100) / 100)
+    def post(self, request):
+        image_id = request.data.get('image_id')
+        edits = request.data.get('edits', [])
+        preview_size = request.data.get('preview_size')
 
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG")
-            content_file = ContentFile(buffer.getvalue())
-            filename = f"preview_chain_{image_id}.jpg"
+        try:
+            original = ImageUpload.objects.get(id=image_id, user=request.user)
+            if preview_size:
+                # Only the phone sees this; Replace / Save as copy render
+                # the stored chain again at full resolution, so it may be WebP.
+                preview_size = parse_preview_size(preview_size)
+                fmt = negotiate_format(request, 'preview')
+                content = render_preview(resolve_original_image_path(original), edits, preview_size, fmt)
+            else:
+                fmt = 'JPEG'
+                content = render_file(resolve_original_image_path(original), edits)
 
             EditedImage.objects.filter(original=original, temporary=True).delete()
 
-            filename = f"preview_chain_{image_id}.jpg"
+            filename = f"preview_chain_{image_id}.{EXTENSIONS[fmt]}"
             preview_path = os.path.join(settings.MEDIA_ROOT, 'edited', filename)
 
             with open(preview_path, 'wb') as f:
-                f.write(buffer.getvalue())
+                f.write(content)
 
-            edited = EditedImage.objects.create(original=original, temporary=True)
+            edited = EditedImage.objects.create(
+                original=original, temporary=True, edits=edits, preview_size=preview_size or None
+            )
             edited.edited.name = f'edited/{filename}'
             edited.save()
 
             serializer = EditedImageSerializer(edited, context={'request': request})
-            return Response(serializer.data)
+            return Response(serializer.data, headers={'Vary': 'Accept'})
 
         except ImageUpload.DoesNotExist:
             return Response({'error': 'Image not found'}, status=404)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -630,69 +813,68 @@ class FaceClusteringView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        user = request.user
-        threshold = 0.5
-
-        user_clusters = FaceCluster.objects.filter(facematch__image__user=user).distinct()
-        cluster_map = []
-
-        for cluster in user_clusters:
-            example_match = FaceMatch.objects.filter(cluster=cluster).first()
-            if example_match:
-                embedding = FaceEmbedding.objects.filter(image=example_match.image).first()
-                if embedding:
-                    cluster_map.append((np.array(embedding.encoding), cluster))
-
-        new_embeddings = FaceEmbedding.objects.filter(clustered=False, image__user=user)
-
-        for emb in new_embeddings:
-            encoding = np.array(emb.encoding)
-            assigned_cluster = None
-
-            for ref_encoding, cluster in cluster_map:
-                if face_recognition.compare_faces([ref_encoding], encoding, tolerance=threshold)[0]:
-                    assigned_cluster = cluster
-                    break
+        cluster_user_faces(request.user)
+        return Response({"message": "Face clustering complete."})
 
-            if not assigned_cluster:
+class SimilarFacesView(APIView):
+    """
+    "Find this person": return the images whose faces are nearest to the
+    given face. The face is picked with one of `embedding_id`, `image_id`
+    (plus optional `face` index within that image) or a raw 128-value
+    `encoding`. Optional `k` (default 20) and `max_distance`.
+    """
+    permission_classes = [IsAuthenticated]
 
-                assigned_cluster = FaceCluster.objects.create()
-                cluster_map.append((encoding, assigned_cluster))
+    def post(self, request):
+        try:
+            k = max(1, min(int(request.data.get('k', 20)), 200))
+            max_distance = request.data.get('max_distance')
+            max_distance = float(max_distance) if max_distance is not None else None
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid k or max_distance'}, status=400)
 
-            FaceMatch.objects.create(cluster=assigned_cluster, image=emb.image)
+        embeddings = FaceEmbedding.objects.filter(image__user=request.user)
+        exclude_ids = ()
 
+        if request.data.get('embedding_id') is not None:
             try:
-                filename = f'face_{emb.image.id}.jpg'
-                save_path = os.path.join('media/uploads', filename)
-
-                if not os.path.exists(save_path):
-                    img_path = emb.image.image.path
-                    img = face_recognition.load_image_file(img_path)
-                    face_locations = face_recognition.face_locations(img)
-
-                    if face_locations:
-                        top, right, bottom, left = face_locations[0]
-                        pil_img = Image.open(img_path)
-                        img_width, img_height = pil_img.size
-
-                        pad = 150
-                        top = max(0, top - pad)
-                        left = max(0, left - pad)
-                        bottom = min(img_height, bottom + pad)
-                        right = min(img_width, right + pad)
-
-                        face_crop = pil_img.crop((left, top, right, bottom))
-                        face_crop = face_crop.resize((80, 80))
-                        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                        face_crop.save(save_path)
-
-            except Exception as e:
-                print(f"[Thumbnail] Could not regenerate for image {emb.image.id}: {e}")
+                embedding_id = int(request.data['embedding_id'])
+            except (TypeError, ValueError):
+                return Response({'error': 'Invalid embedding_id'}, status=400)
+            embedding = embeddings.filter(id=embedding_id).first()
+            if embedding is None:
+                return Response({'error': 'Face not found'}, status=404)
+            encoding = unpack_encoding(embedding.encoding)
+            exclude_ids = (embedding.id,)
+
+        elif request.data.get('image_id') is not None:
+            try:
+                image_id = int(request.data['image_id'])
+                face = int(request.data.get('face', 0))
+            except (TypeError, ValueError):
+                return Response({'error': 'Invalid image_id or face'}, status=400)
+            faces = list(embeddings.filter(image_id=image_id).order_by('id'))
+            if not 0 <= face < len(faces):
+                return Response({'error': 'Face not found'}, status=404)
+            encoding = unpack_encoding(faces[face].encoding)
+            exclude_ids = (faces[face].id,)
+
+        elif request.data.get('encoding') is not None:
+            encoding = request.data['encoding']
+            try:
+                encoding = np.asarray(encoding, dtype=np.float32)
+                if not isinstance(request.data['encoding'], list) or encoding.shape != (128,) or not np.isfinite(encoding).all():
+                    raise ValueError
+            except (TypeError, ValueError):
+                return Response({'error': 'encoding must be a list of 128 numbers'}, status=400)
 
-            emb.clustered = True
-            emb.save()
+        else:
+            return Response({'error': 'Provide embedding_id, image_id or encoding'}, status=400)
 
-        return Response({"message": "Face clustering complete."})
+        results = find_similar_faces(
+            request.user, encoding, k=k, exclude_ids=exclude_ids, max_distance=max_distance
+        )
+        return Response({'results': results})
 
 class RenameFaceClusterView(APIView):
     permission_classes = [IsAuthenticated]
@@ -706,6 +888,7 @@ class RenameFaceClusterView(APIView):
             cluster = FaceCluster.objects.get(id=pk)
             cluster.name = name
             cluster.save()
+            bump_face_groups(request.user.id)
             return Response({'message': 'Cluster renamed successfully'})
         except FaceCluster.DoesNotExist:
             return Response({'error': 'Cluster not found'}, status=404)